@@ -0,0 +1,119 @@
+"""
+Import time budget for `perchance` and web_api.
+
+Runs every statement in a fresh interpreter with `-X importtime`, reports
+the median cumulative import time and the slowest imported packages, and
+checks that modules only needed by some code paths are not loaded. The exit
+status is 1 if a budget is exceeded or a deferred module was imported.
+
+Run from the repository root:
+    python benchmarks/import_time.py [--runs 5] [--budget-ms 150] [--api-budget-ms 1500]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# deferred modules must stay unloaded after the statement
+CHECKS: list[tuple[str, str, tuple[str, ...]]] = [
+    ('import perchance', 'perchance', ('playwright', 'aiofiles', 'aiohttp')),
+    ('import perchance; perchance.ImageGenerator', 'perchance.imagegen', ('playwright', 'aiofiles')),
+    ('import perchance; perchance.TextGenerator', 'perchance.textgen', ('playwright', 'aiofiles')),
+    ('import web_api', 'web_api', ('playwright', 'aiofiles', 'uvicorn', 'PIL'))
+]
+
+
+def run_importtime(code: str) -> subprocess.CompletedProcess:
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        raise SystemExit(f"{code!r} failed:\n{process.stderr[-2000:]}")
+    return process
+
+
+def parse(stderr: str) -> list[tuple[int, str]]:
+    """Cumulative time in µs and name of every top level import."""
+    imports = []
+
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+
+        # nested imports are indented
+        if not name[1:].startswith(' '):
+            imports.append((int(cumulative), name.strip()))
+
+    return imports
+
+
+def measure(
+    statement: str,
+    deferred: tuple[str, ...],
+    startup: set[str]
+) -> tuple[float, list[tuple[int, str]], list[str]]:
+    """Import time of the statement in µs, its slowest imports and the deferred modules loaded."""
+    code = (
+        f"{statement}\n"
+        "import sys\n"
+        f"print(','.join(m for m in {deferred!r} if m in sys.modules))"
+    )
+    process = run_importtime(code)
+
+    # modules imported by the interpreter itself are left out
+    imports = [(time, name) for time, name in parse(process.stderr) if name not in startup]
+    total = sum(time for time, _ in imports)
+
+    loaded = [m for m in process.stdout.strip().split(',') if m]
+    return total, sorted(imports, reverse=True)[:5], loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=150.0, help="budget of `import perchance`")
+    parser.add_argument('--api-budget-ms', type=float, default=1500.0, help="budget of `import web_api`")
+    args = parser.parse_args()
+
+    startup = {name for _, name in parse(run_importtime('pass').stderr)}
+    failed = False
+
+    for statement, module, deferred in CHECKS:
+        runs = [measure(statement, deferred, startup) for _ in range(args.runs)]
+        total = statistics.median(run[0] for run in runs) / 1000
+        _, slowest, loaded = runs[-1]
+
+        if module == 'web_api':
+            budget = args.api_budget_ms
+        elif module == 'perchance':
+            budget = args.budget_ms
+        else:
+            budget = None
+
+        status = 'ok'
+        if budget is not None and total > budget:
+            status = f'OVER BUDGET ({budget:.0f} ms)'
+            failed = True
+        if loaded:
+            status = f"LOADED {', '.join(loaded)}"
+            failed = True
+
+        print(f"{statement:45} {total:8.1f} ms  {status}")
+        for cumulative, name in slowest:
+            print(f"    {name:30} {cumulative / 1000:8.1f} ms")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
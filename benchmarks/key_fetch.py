@@ -0,0 +1,125 @@
+"""
+Key fetch wall time with and without lean page loading.
+
+Serves a local stand-in for the generator page that pulls in slow images,
+fonts and analytics scripts, and fetches keys from it with a warm browser.
+
+Run from the repository root:
+    python benchmarks/key_fetch.py [--rounds 10] [--assets 40] [--asset-delay 0.2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perchance
+
+
+PAGE = """<!doctype html>
+<html><body><iframe src="/frame"></iframe></body></html>
+"""
+
+FRAME = """<!doctype html>
+<html>
+<head>
+<style>@font-face {{ font-family: f; src: url(/asset/font.woff2); }} body {{ font-family: f; }}</style>
+<script src="/asset/analytics.js"></script>
+</head>
+<body>
+{images}
+<button id="generateButtonEl" onclick="fetch('/api/verifyUser?thread=0').then(r => r.json())">Generate</button>
+</body>
+</html>
+"""
+
+
+def make_app(assets: int, asset_delay: float, asset_size: int) -> web.Application:
+    payload = os.urandom(asset_size)
+    frame = FRAME.format(
+        images='\n'.join(f'<img src="/asset/{i}.png">' for i in range(assets))
+    )
+    counter = 0
+
+    async def page(request: web.Request) -> web.Response:
+        return web.Response(text=PAGE, content_type='text/html')
+
+    async def frame_page(request: web.Request) -> web.Response:
+        return web.Response(text=frame, content_type='text/html')
+
+    async def asset(request: web.Request) -> web.Response:
+        await asyncio.sleep(asset_delay)
+        name = request.match_info['name']
+
+        if name.endswith('.js'):
+            return web.Response(text='', content_type='application/javascript')
+        elif name.endswith('.woff2'):
+            return web.Response(body=payload, content_type='font/woff2')
+        return web.Response(body=payload, content_type='image/png')
+
+    async def verify_user(request: web.Request) -> web.Response:
+        nonlocal counter
+        counter += 1
+        return web.json_response({'status': 'success', 'userKey': f'key-{counter}'})
+
+    app = web.Application()
+    app.router.add_get('/page', page)
+    app.router.add_get('/frame', frame_page)
+    app.router.add_get('/asset/{name}', asset)
+    app.router.add_get('/api/verifyUser', verify_user)
+    return app
+
+
+async def measure(gen_cls: type, lean: bool, rounds: int) -> list[float]:
+    timings = []
+
+    async with perchance.BrowserManager(idle_timeout=None, lean=lean) as browser:
+        # warm up the browser so only the page load is measured
+        await gen_cls._fetch_key(browser)
+
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await gen_cls._fetch_key(browser)
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+async def run(args: argparse.Namespace) -> None:
+    runner = web.AppRunner(make_app(args.assets, args.asset_delay, args.asset_size))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    class LocalImageGenerator(perchance.ImageGenerator):
+        BASE_URL = f"http://127.0.0.1:{port}/api"
+        PAGE_URL = f"http://127.0.0.1:{port}/page"
+
+    try:
+        for lean in (False, True):
+            timings = await measure(LocalImageGenerator, lean, args.rounds)
+            print(
+                f"lean={str(lean):5}  mean {statistics.mean(timings) * 1000:7.1f} ms"
+                f"  min {min(timings) * 1000:7.1f} ms  max {max(timings) * 1000:7.1f} ms"
+            )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--assets', type=int, default=40)
+    parser.add_argument('--asset-delay', type=float, default=0.2)
+    parser.add_argument('--asset-size', type=int, default=256 * 1024)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
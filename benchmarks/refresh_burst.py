@@ -0,0 +1,66 @@
+"""
+Burst of concurrent key refreshes against a stubbed key fetch.
+
+Run from the repository root:
+    python benchmarks/refresh_burst.py [--callers 50] [--fetch-time 2.0]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perchance
+
+
+class StubImageGenerator(perchance.ImageGenerator):
+    fetches: int = 0
+    fetch_time: float = 2.0
+
+    @classmethod
+    async def _fetch_key(cls, browser=None) -> str:
+        # stands in for launching a browser
+        cls.fetches += 1
+        await asyncio.sleep(cls.fetch_time)
+        return f"key-{cls.fetches}"
+
+    async def _verify_key(self, key: str) -> bool:
+        return True
+
+
+async def burst(callers: int) -> None:
+    gen = StubImageGenerator(key_store=False)
+    StubImageGenerator.fetches = 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(gen.refresh() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+
+    print(f"coalesced:   {callers} callers -> {StubImageGenerator.fetches} fetch(es) in {elapsed:.2f}s")
+
+    StubImageGenerator.fetches = 0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(StubImageGenerator._fetch_key() for _ in range(callers)))
+    elapsed = time.perf_counter() - start
+
+    print(f"uncoalesced: {callers} callers -> {StubImageGenerator.fetches} fetch(es) in {elapsed:.2f}s")
+
+    await gen.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--callers', type=int, default=50)
+    parser.add_argument('--fetch-time', type=float, default=2.0)
+    args = parser.parse_args()
+
+    StubImageGenerator.fetch_time = args.fetch_time
+    asyncio.run(burst(args.callers))
+
+
+if __name__ == '__main__':
+    main()
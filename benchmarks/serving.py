@@ -0,0 +1,226 @@
+"""
+Throughput of web_api in dev mode against the production serving mode.
+
+Starts `standin.py` in a separate process, then runs web_api as
+`web_api.main()` does (one process with reload) and through `serve_api.py`
+(several workers, uvloop and httptools when installed), and measures the
+endpoints under the same concurrent load. Keys are seeded into a temporary
+key store, so no browser is launched.
+
+The production server is then sent SIGTERM with requests in flight to check
+that they are drained instead of dropped.
+
+Run from the repository root:
+    python benchmarks/serving.py [--requests 500] [--concurrency 64] [--workers 4]
+"""
+
+import aiohttp
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perchance
+import standin
+from suite import Result, run_load
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+ENDPOINTS = ('image', 'text')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_standin(args: argparse.Namespace) -> None:
+    asyncio.run(standin.serve(args))
+
+
+def server_command(mode: str, port: int, args: argparse.Namespace) -> list[str]:
+    if mode == 'dev':
+        # same settings as web_api.main()
+        return [
+            sys.executable, '-m', 'uvicorn', 'standin_app:app',
+            '--host', '127.0.0.1', '--port', str(port), '--reload', '--log-level', 'info'
+        ]
+
+    return [
+        sys.executable, os.path.join(ROOT, 'serve_api.py'),
+        '--app', 'standin_app:app', '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log'
+    ]
+
+
+async def wait_ready(client: aiohttp.ClientSession, url: str, process: subprocess.Popen) -> None:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with status {process.returncode}")
+        try:
+            async with client.get(url + '/health') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("server did not become ready")
+
+
+def make_call(client: aiohttp.ClientSession, url: str, endpoint: str):
+    async def image(i: int) -> None:
+        async with client.post(url + '/api/txttoimage', json={'prompt': f"benchmark prompt {i}"}) as r:
+            if r.status != 200:
+                raise RuntimeError(f"HTTP {r.status}")
+            await r.read()
+
+    async def text(i: int) -> float | None:
+        start = time.perf_counter()
+        first_chunk = None
+        async with client.post(url + '/api/text', json={'prompt': f"benchmark prompt {i}"}) as r:
+            if r.status != 200:
+                raise RuntimeError(f"HTTP {r.status}")
+            async for event in perchance.iter_events(r.content.iter_any()):
+                if event.event == 'error':
+                    raise RuntimeError(event.data)
+                if first_chunk is None and event.event == 'message':
+                    first_chunk = time.perf_counter() - start
+        return first_chunk
+
+    return image if endpoint == 'image' else text
+
+
+def stop(process: subprocess.Popen) -> float:
+    """Send SIGTERM and return the seconds until the server exited."""
+    start = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    return time.perf_counter() - start
+
+
+async def bench_mode(mode: str, args: argparse.Namespace, env: dict) -> list[Result]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    results = []
+
+    process = subprocess.Popen(
+        server_command(mode, port, args), cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as client:
+            await wait_ready(client, url, process)
+
+            for endpoint in args.endpoints:
+                call = make_call(client, url, endpoint)
+                # lets every worker open its connections first
+                await run_load(Result('warm-up'), call, args.concurrency * 2, args.concurrency)
+                results.append(await run_load(
+                    Result(f"{mode} {endpoint}"), call, args.requests, args.concurrency
+                ))
+
+            if mode == 'prod':
+                # SIGTERM while requests are in flight, all of them must complete
+                call = make_call(client, url, args.endpoints[0])
+                drain = asyncio.ensure_future(
+                    run_load(Result('drain'), call, args.concurrency, args.concurrency)
+                )
+                await asyncio.sleep(args.latency / 2)
+                elapsed = await asyncio.to_thread(stop, process)
+                drained = await drain
+                print(
+                    f"prod drain: {len(drained.latencies)}/{args.concurrency} in-flight requests"
+                    f" completed, server exited after {elapsed:.2f} s"
+                )
+    finally:
+        if process.poll() is None:
+            stop(process)
+
+    return results
+
+
+async def run(args: argparse.Namespace) -> None:
+    args.host = '127.0.0.1'
+    args.port = free_port()
+    url = f"http://127.0.0.1:{args.port}"
+
+    standin_process = multiprocessing.Process(target=run_standin, args=(args,), daemon=True)
+    standin_process.start()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ)
+            env['PERCHANCE_KEY_STORE'] = os.path.join(directory, 'keys.json')
+            env['PERCHANCE_STANDIN_URL'] = url
+            env['PYTHONPATH'] = os.pathsep.join(filter(None, [BENCHMARKS, ROOT, env.get('PYTHONPATH')]))
+
+            os.environ['PERCHANCE_KEY_STORE'] = env['PERCHANCE_KEY_STORE']
+            standin.point_generators_at(url)
+            for _ in range(50):
+                try:
+                    await standin.seed_key_store(perchance.FileKeyStore(), url)
+                    break
+                except aiohttp.ClientError:
+                    await asyncio.sleep(0.1)
+
+            print(
+                f"stand-in {url}: latency {args.latency * 1000:.0f} ms,"
+                f" image {args.image_size // 1024} KiB, {args.text_chunks} text chunks;"
+                f" {args.requests} requests at concurrency {args.concurrency}\n"
+            )
+
+            results = {}
+            for mode in ('dev', 'prod'):
+                for result in await bench_mode(mode, args, env):
+                    results[result.name] = result
+    finally:
+        standin_process.terminate()
+        standin_process.join()
+
+    print()
+    for result in results.values():
+        print(result.report())
+
+    print()
+    for endpoint in args.endpoints:
+        dev, prod = results[f"dev {endpoint}"], results[f"prod {endpoint}"]
+        if dev.throughput:
+            print(f"{endpoint:6} prod/dev throughput: {prod.throughput / dev.throughput:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="workers of the production mode")
+    parser.add_argument('--only', default='', help=f"comma separated subset of: {', '.join(ENDPOINTS)}")
+    standin.add_arguments(parser)
+    args = parser.parse_args()
+
+    args.endpoints = [e for e in ENDPOINTS if not args.only or e in args.only.split(',')]
+    if not args.endpoints:
+        raise SystemExit(f"Unknown endpoints: {args.only}")
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Micro-benchmark and split-offset fuzzing for the SSE parser.
+
+Builds a text-generation stream, checks that feeding it split at random
+offsets always yields the same events as feeding it whole, then compares
+parsing throughput with the old per-chunk `split('\\n\\n')` approach.
+
+Run from the repository root:
+    python benchmarks/sse_parser.py [--frames 20000] [--rounds 500] [--chunk 1400]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perchance.sse import SSEDecoder
+
+
+WORDS = ['cat', 'moon', 'café', 'naïve', '貓', '月亮', 'ねこ', '🐈', '🌕', 'stairs']
+
+
+def make_stream(frames: int, rng: random.Random) -> tuple[bytes, list[str]]:
+    texts = []
+    parts = []
+
+    for i in range(frames):
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 8)))
+        texts.append(text)
+
+        frame = 'data:' + json.dumps({'text': text}, ensure_ascii=False) + '\n\n'
+        if i % 97 == 0:
+            frame = f': keep-alive\nid: {i}\n' + frame
+        parts.append(frame)
+
+    return ''.join(parts).encode(), texts
+
+
+def split_at(stream: bytes, offsets: list[int]) -> list[bytes]:
+    bounds = [0, *offsets, len(stream)]
+    return [stream[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def parse(chunks: list[bytes]) -> list[str]:
+    decoder = SSEDecoder()
+    texts = []
+
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            texts.append(event.json()['text'])
+    for event in decoder.flush():
+        texts.append(event.json()['text'])
+
+    return texts
+
+
+def parse_naive(chunks: list[bytes]) -> list[str]:
+    texts = []
+
+    for chunk in chunks:
+        for line in chunk.decode().split('\n\n'):
+            if len(line) == 0 or line.startswith(':'):
+                continue
+            texts.append(json.loads(line[5:])['text'])
+
+    return texts
+
+
+def fuzz(stream: bytes, expected: list[str], rounds: int, rng: random.Random) -> None:
+    for _ in range(rounds):
+        count = rng.randint(1, min(len(stream) - 1, 2000))
+        offsets = sorted(rng.sample(range(1, len(stream)), count))
+        result = parse(split_at(stream, offsets))
+
+        if result != expected:
+            raise AssertionError(f"Mismatch when split at {len(offsets)} offsets")
+
+    # every single split point of a short prefix, including inside characters
+    prefix_end = stream.index(b'\n\n', 2000) + 2
+    prefix = stream[:prefix_end]
+    prefix_expected = parse([prefix])
+    for offset in range(1, len(prefix)):
+        if parse(split_at(prefix, [offset])) != prefix_expected:
+            raise AssertionError(f"Mismatch when split at offset {offset}")
+
+    print(f"fuzz: {rounds} random splits and {len(prefix) - 1} single splits ok")
+
+
+def bench(name: str, func, chunks: list[bytes], repeat: int = 5) -> None:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            func(chunks)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            print(f"{name:>8}: fails on split frames")
+            return
+        best = min(best, time.perf_counter() - start)
+
+    size = sum(len(chunk) for chunk in chunks)
+    print(f"{name:>8}: {best * 1000:8.1f} ms  {size / best / 1e6:7.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=500)
+    parser.add_argument('--chunk', type=int, default=1400, help="bytes per chunk, like a TCP segment")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    stream, expected = make_stream(args.frames, rng)
+
+    if parse([stream]) != expected:
+        raise AssertionError("Whole stream parsed incorrectly")
+    fuzz(stream, expected, args.rounds, rng)
+
+    aligned = [frame + b'\n\n' for frame in stream.split(b'\n\n') if frame]
+    fixed = split_at(stream, list(range(args.chunk, len(stream), args.chunk)))
+
+    print(f"frame-aligned chunks ({len(aligned)}):")
+    bench('decoder', parse, aligned)
+    bench('naive', parse_naive, aligned)
+
+    print(f"{args.chunk}-byte chunks ({len(fixed)}):")
+    bench('decoder', parse, fixed)
+    bench('naive', parse_naive, fixed)
+
+
+if __name__ == '__main__':
+    main()
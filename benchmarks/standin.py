@@ -0,0 +1,325 @@
+"""
+Local stand-in for the Perchance image and text services.
+
+Emulates the generator pages with the `/verifyUser` flow, key verification,
+`/generate` for images and text (as a server-sent events stream) and
+`/downloadTemporaryImage`, with configurable latency and payload sizes and
+randomly injected failures. Used by the benchmarks; it can also be run on
+its own to point other tools at it.
+
+Run from the repository root:
+    python benchmarks/standin.py [--port 8765] [--latency 0.05] [--p429 0.05]
+"""
+
+import aiohttp
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perchance
+
+
+PAGE = """<!doctype html>
+<html><body><iframe src="{prefix}/frame"></iframe></body></html>
+"""
+
+FRAME = """<!doctype html>
+<html><body>
+<button id="{button}" onclick="fetch('{prefix}/api/verifyUser?thread=0').then(r => r.json())">Generate</button>
+<button id="stopBtn">Stop</button>
+</body></html>
+"""
+
+
+class Faults:
+    """Probabilities of the failures injected into `/generate` responses."""
+
+    def __init__(
+        self,
+        *,
+        forbidden: float = 0.0,
+        rate_limited: float = 0.0,
+        empty: float = 0.0,
+        garbled: float = 0.0,
+        invalid_key: float = 0.0,
+        retry_after: float = 1.0
+    ) -> None:
+        self.forbidden: float = forbidden
+        self.rate_limited: float = rate_limited
+        self.empty: float = empty
+        self.garbled: float = garbled
+        self.invalid_key: float = invalid_key
+        self.retry_after: float = retry_after
+
+    def pick(self, rng: random.Random) -> str | None:
+        """Draw the failure for one response, if any."""
+        roll = rng.random()
+        for name in ('forbidden', 'rate_limited', 'empty', 'garbled', 'invalid_key'):
+            roll -= getattr(self, name)
+            if roll < 0:
+                return name
+        return None
+
+
+class StandIn:
+    """
+    Configuration and state of the stand-in server.
+
+    Parameters
+    ----------
+    latency: `float`
+        Seconds before `/generate` answers.
+    download_latency: `float`
+        Seconds before `/downloadTemporaryImage` starts sending the image.
+    image_size: `int`
+        Size of the served images in bytes.
+    text_chunks: `int`
+        Number of chunks in a text stream.
+    text_chunk_delay: `float`
+        Seconds between text chunks.
+    faults: `Faults` | `None`
+        Failures injected into `/generate`.
+    seed: `int` | `None`
+        Seed of the fault injection.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0.05,
+        download_latency: float = 0.01,
+        image_size: int = 256 * 1024,
+        text_chunks: int = 50,
+        text_chunk_delay: float = 0.005,
+        faults: Faults | None = None,
+        seed: int | None = None
+    ) -> None:
+        self.latency: float = latency
+        self.download_latency: float = download_latency
+        self.image_size: int = image_size
+        self.text_chunks: int = text_chunks
+        self.text_chunk_delay: float = text_chunk_delay
+        self.faults: Faults = faults or Faults()
+        self.keys: set[str] = set()
+        self.requests: dict[str, int] = {}
+        self._rng: random.Random = random.Random(seed)
+        self._image: bytes = os.urandom(image_size)
+
+    def _count(self, name: str) -> None:
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    def _fault_response(self, fault: str) -> web.Response:
+        if fault == 'forbidden':
+            return web.Response(status=403, text='Forbidden')
+        elif fault == 'rate_limited':
+            return web.Response(
+                status=429,
+                text='Too Many Requests',
+                headers={'Retry-After': str(self.faults.retry_after)}
+            )
+        elif fault == 'empty':
+            return web.Response(text='', content_type='application/json')
+        elif fault == 'garbled':
+            return web.Response(text='{"status": "succ', content_type='application/json')
+        return web.json_response({'status': 'invalid_key'})
+
+    async def page(self, request: web.Request) -> web.Response:
+        prefix = '/' + request.match_info['service']
+        return web.Response(text=PAGE.format(prefix=prefix), content_type='text/html')
+
+    async def frame(self, request: web.Request) -> web.Response:
+        service = request.match_info['service']
+        button = 'generateButtonEl' if service == 'image' else 'generateBtn'
+        return web.Response(
+            text=FRAME.format(prefix='/' + service, button=button),
+            content_type='text/html'
+        )
+
+    async def verify_user(self, request: web.Request) -> web.Response:
+        self._count('verifyUser')
+        key = f"standin-{uuid.uuid4().hex}"
+        self.keys.add(key)
+        return web.json_response({'status': 'success', 'userKey': key})
+
+    async def check_verification(self, request: web.Request) -> web.Response:
+        self._count('checkVerificationStatus')
+        if request.query.get('userKey') in self.keys:
+            return web.Response(text='{"status": "verified"}')
+        return web.Response(text='{"status": "not_verified"}')
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        service = request.match_info['service']
+        self._count(f'{service}/generate')
+        await asyncio.sleep(self.latency)
+
+        fault = self.faults.pick(self._rng)
+        if fault is None and request.query.get('userKey') not in self.keys:
+            fault = 'invalid_key'
+
+        if service == 'text':
+            return await self._generate_text(request, fault)
+
+        if fault is not None:
+            return self._fault_response(fault)
+
+        seed = int(request.query.get('seed', -1))
+        width, height = map(int, request.query.get('resolution', '768x512').split('x'))
+        return web.json_response({
+            'status': 'success',
+            'imageId': uuid.uuid4().hex,
+            'fileExtension': 'jpeg',
+            'seed': seed if seed != -1 else self._rng.randrange(2 ** 31),
+            'width': width,
+            'height': height,
+            'maybeNsfw': False
+        })
+
+    async def _generate_text(self, request: web.Request, fault: str | None) -> web.StreamResponse:
+        if fault in ('forbidden', 'rate_limited'):
+            return self._fault_response(fault)
+        elif fault == 'invalid_key':
+            return web.json_response({'status': 'invalid_key'}, status=400)
+        elif fault is not None:
+            # the stream endpoint reports other failures as bad gateways
+            return web.Response(status=502, text='' if fault == 'empty' else '{"status": "succ')
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+
+        for i in range(self.text_chunks):
+            await asyncio.sleep(self.text_chunk_delay)
+            await response.write(f"data: {json.dumps({'text': f'word{i} '})}\n\n".encode())
+
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def download(self, request: web.Request) -> web.StreamResponse:
+        self._count('downloadTemporaryImage')
+        await asyncio.sleep(self.download_latency)
+
+        response = web.StreamResponse(headers={'Content-Type': 'image/jpeg'})
+        response.content_length = len(self._image)
+        await response.prepare(request)
+
+        view = memoryview(self._image)
+        for start in range(0, len(view), 64 * 1024):
+            await response.write(view[start:start + 64 * 1024])
+
+        await response.write_eof()
+        return response
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/{service}/page', self.page)
+        app.router.add_get('/{service}/frame', self.frame)
+        app.router.add_get('/{service}/api/verifyUser', self.verify_user)
+        app.router.add_get('/{service}/api/checkVerificationStatus', self.check_verification)
+        app.router.add_post('/{service}/api/generate', self.generate)
+        app.router.add_get('/{service}/api/downloadTemporaryImage', self.download)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> tuple[web.AppRunner, str]:
+        """Serve the stand-in, returning the runner and its base URL."""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return runner, f"http://{host}:{port}"
+
+
+def point_generators_at(url: str) -> None:
+    """Send all requests of the generator classes to a stand-in at the URL."""
+    perchance.ImageGenerator.BASE_URL = url + '/image/api'
+    perchance.ImageGenerator.PAGE_URL = url + '/image/page'
+    perchance.TextGenerator.BASE_URL = url + '/text/api'
+    perchance.TextGenerator.PAGE_URL = url + '/text/page'
+
+
+async def seed_key_store(store: perchance.KeyStore, url: str, pool_size: int = 1) -> None:
+    """
+    Store stand-in keys for both generators, so no browser is needed.
+
+    Call after `point_generators_at()`.
+    """
+    async with aiohttp.ClientSession() as session:
+        for gen_cls, service in ((perchance.ImageGenerator, 'image'), (perchance.TextGenerator, 'text')):
+            for index in range(pool_size):
+                async with session.get(f"{url}/{service}/api/verifyUser") as response:
+                    key = (await response.json())['userKey']
+
+                name = gen_cls.BASE_URL if index == 0 else f"{gen_cls.BASE_URL}#{index}"
+                await store.save(name, perchance.StoredKey(key=key, fetched_at=time.time()))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the stand-in options to a command line parser."""
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds before /generate answers")
+    parser.add_argument('--download-latency', type=float, default=0.01)
+    parser.add_argument('--image-size', type=int, default=256 * 1024)
+    parser.add_argument('--text-chunks', type=int, default=50)
+    parser.add_argument('--text-chunk-delay', type=float, default=0.005)
+    parser.add_argument('--p403', type=float, default=0.0, help="share of 403 responses")
+    parser.add_argument('--p429', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--pempty', type=float, default=0.0, help="share of empty responses")
+    parser.add_argument('--pgarbled', type=float, default=0.0, help="share of garbled JSON responses")
+    parser.add_argument('--pinvalid-key', type=float, default=0.0, help="share of invalid_key responses")
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def from_arguments(args: argparse.Namespace) -> StandIn:
+    """Create a stand-in from options added by `add_arguments()`."""
+    return StandIn(
+        latency=args.latency,
+        download_latency=args.download_latency,
+        image_size=args.image_size,
+        text_chunks=args.text_chunks,
+        text_chunk_delay=args.text_chunk_delay,
+        faults=Faults(
+            forbidden=args.p403,
+            rate_limited=args.p429,
+            empty=args.pempty,
+            garbled=args.pgarbled,
+            invalid_key=args.pinvalid_key,
+            retry_after=args.retry_after
+        ),
+        seed=args.seed
+    )
+
+
+async def serve(args: argparse.Namespace) -> None:
+    runner, url = await from_arguments(args).start(args.host, args.port)
+    print(f"stand-in listening on {url}")
+    print(f"  image: {url}/image/api  page: {url}/image/page")
+    print(f"  text:  {url}/text/api  page: {url}/text/page")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+"""
+web_api with the generators pointed at a stand-in, for serving benchmarks.
+
+The stand-in URL is read from `PERCHANCE_STANDIN_URL`. Every worker process
+imports this module instead of web_api, so all of them talk to the stand-in:
+    PERCHANCE_STANDIN_URL=http://127.0.0.1:8765 PYTHONPATH=benchmarks \
+        python serve_api.py --app standin_app:app
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import standin
+
+standin.point_generators_at(os.environ['PERCHANCE_STANDIN_URL'])
+
+from web_api import app  # noqa: E402
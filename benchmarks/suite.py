@@ -0,0 +1,315 @@
+"""
+Throughput and latency of the library and web_api against a local stand-in.
+
+Starts `standin.py` in-process, points the generators at it and measures
+`ImageGenerator.image`, `ImageResponse.download`, `TextGenerator.text` and
+the web_api endpoints under concurrent load. Keys are seeded into a
+temporary key store, so no browser is launched unless a key is rejected.
+
+Save a run with `--json` and compare later runs against it with
+`--baseline`; the exit status is 1 if any p95 latency regressed by more
+than `--tolerance`.
+
+Run from the repository root:
+    python benchmarks/suite.py [--requests 200] [--concurrency 16] [--only image,text]
+    python benchmarks/suite.py --p429 0.05 --p403 0.02 --pgarbled 0.01
+"""
+
+import aiohttp
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import perchance
+import standin
+
+
+SCENARIOS = ('image', 'download', 'text', 'api_image', 'api_image_raw', 'api_text')
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of the values."""
+    if not values:
+        return float('nan')
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+class Result:
+    """Latencies and errors of one scenario."""
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.latencies: list[float] = []
+        self.first_chunk: list[float] = []
+        self.errors: int = 0
+        self.elapsed: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> dict:
+        summary = {
+            'ok': len(self.latencies),
+            'errors': self.errors,
+            'throughput': self.throughput,
+            'p50': percentile(self.latencies, 50),
+            'p95': percentile(self.latencies, 95),
+            'p99': percentile(self.latencies, 99)
+        }
+        if self.first_chunk:
+            summary['first_chunk_p50'] = percentile(self.first_chunk, 50)
+            summary['first_chunk_p95'] = percentile(self.first_chunk, 95)
+        return summary
+
+    def report(self) -> str:
+        s = self.summary()
+        line = (
+            f"{self.name:14} {s['ok']:6d} ok {s['errors']:4d} err {s['throughput']:8.1f} req/s"
+            f"  p50 {s['p50'] * 1000:8.1f} ms  p95 {s['p95'] * 1000:8.1f} ms  p99 {s['p99'] * 1000:8.1f} ms"
+        )
+        if self.first_chunk:
+            line += (
+                f"  first chunk p50 {s['first_chunk_p50'] * 1000:.1f} ms"
+                f" p95 {s['first_chunk_p95'] * 1000:.1f} ms"
+            )
+        return line
+
+
+async def run_load(
+    result: Result,
+    call: Callable[[int], Awaitable[float | None]],
+    requests: int,
+    concurrency: int
+) -> Result:
+    """
+    Run `call(i)` for every request with bounded concurrency.
+
+    The call may return the time to its first chunk.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                first_chunk = await call(i)
+            except Exception:
+                result.errors += 1
+                return
+
+            result.latencies.append(time.perf_counter() - start)
+            if first_chunk is not None:
+                result.first_chunk.append(first_chunk)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def bench_library(args: argparse.Namespace, only: set[str]) -> list[Result]:
+    results = []
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+
+    image_gen = perchance.ImageGenerator(session=session, pool_size=args.pool_size)
+    text_gen = perchance.TextGenerator(session=session, pool_size=args.pool_size, max_streams=args.concurrency)
+
+    try:
+        if 'image' in only:
+            async def image(i: int) -> None:
+                await image_gen.image(f"benchmark prompt {i}")
+
+            results.append(await run_load(Result('image'), image, args.requests, args.concurrency))
+
+        if 'download' in only:
+            # generated up front, only the downloads are measured
+            generated = await asyncio.gather(*(
+                image_gen.image(f"benchmark download {i}") for i in range(args.requests)
+            ), return_exceptions=True)
+            images = [r for r in generated if isinstance(r, perchance.ImageResponse)]
+
+            async def download(i: int) -> None:
+                await images[i].download()
+
+            results.append(await run_load(Result('download'), download, len(images), args.concurrency))
+
+        if 'text' in only:
+            async def text(i: int) -> float | None:
+                start = time.perf_counter()
+                first_chunk = None
+                async for _ in text_gen.text(f"benchmark prompt {i}"):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                return first_chunk
+
+            results.append(await run_load(Result('text'), text, args.requests, args.concurrency))
+    finally:
+        await image_gen.aclose()
+        await text_gen.aclose()
+        await session.close()
+
+    return results
+
+
+async def bench_web_api(args: argparse.Namespace, only: set[str]) -> list[Result]:
+    import uvicorn
+    import web_api
+
+    results = []
+    config = uvicorn.Config(web_api.app, host='127.0.0.1', port=0, log_level='warning')
+    server = uvicorn.Server(config)
+
+    # web_api prints every request
+    with contextlib.redirect_stdout(io.StringIO()):
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            if serving.done():
+                await serving
+            await asyncio.sleep(0.01)
+
+        port = server.servers[0].sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+
+        try:
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as client:
+                async def post(path: str, payload: dict) -> aiohttp.ClientResponse:
+                    response = await client.post(url + path, json=payload)
+                    if response.status != 200:
+                        response.release()
+                        raise RuntimeError(f"{path}: HTTP {response.status}")
+                    return response
+
+                if 'api_image' in only:
+                    async def api_image(i: int) -> None:
+                        async with await post('/api/txttoimage', {'prompt': f"benchmark prompt {i}"}) as r:
+                            await r.read()
+
+                    results.append(await run_load(Result('api_image'), api_image, args.requests, args.concurrency))
+
+                if 'api_image_raw' in only:
+                    async def api_image_raw(i: int) -> float:
+                        start = time.perf_counter()
+                        async with await post('/api/txttoimage/raw', {'prompt': f"benchmark prompt {i}"}) as r:
+                            first_chunk = None
+                            async for _ in r.content.iter_any():
+                                if first_chunk is None:
+                                    first_chunk = time.perf_counter() - start
+                        return first_chunk
+
+                    results.append(
+                        await run_load(Result('api_image_raw'), api_image_raw, args.requests, args.concurrency)
+                    )
+
+                if 'api_text' in only:
+                    async def api_text(i: int) -> float:
+                        start = time.perf_counter()
+                        first_chunk = None
+                        async with await post('/api/text', {'prompt': f"benchmark prompt {i}"}) as r:
+                            async for event in perchance.iter_events(r.content.iter_any()):
+                                if event.event == 'error':
+                                    raise RuntimeError(event.data)
+                                if first_chunk is None and event.event == 'message':
+                                    first_chunk = time.perf_counter() - start
+                        return first_chunk
+
+                    results.append(await run_load(Result('api_text'), api_text, args.requests, args.concurrency))
+        finally:
+            server.should_exit = True
+            await serving
+
+    return results
+
+
+def compare(results: list[Result], baseline_path: str, tolerance: float) -> bool:
+    """Print p95 changes against a saved run, returning whether any regressed."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    regressed = False
+    print(f"\np95 against {baseline_path}:")
+
+    for result in results:
+        before = baseline.get(result.name, {}).get('p95')
+        if not before:
+            continue
+
+        after = result.summary()['p95']
+        change = after / before - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+
+        print(f"{result.name:14} {before * 1000:8.1f} ms -> {after * 1000:8.1f} ms  {change:+7.1%}{flag}")
+
+    return regressed
+
+
+async def run(args: argparse.Namespace) -> int:
+    only = set(args.only.split(',')) if args.only else set(SCENARIOS)
+    unknown = only - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    stand_in = standin.from_arguments(args)
+    runner, url = await stand_in.start()
+    standin.point_generators_at(url)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # keeps the benchmark keys away from the real key store
+        os.environ['PERCHANCE_KEY_STORE'] = os.path.join(directory, 'keys.json')
+        await standin.seed_key_store(perchance.FileKeyStore(), url, args.pool_size)
+
+        try:
+            print(
+                f"stand-in {url}: latency {args.latency * 1000:.0f} ms,"
+                f" image {args.image_size // 1024} KiB, {args.text_chunks} text chunks\n"
+            )
+
+            results = await bench_library(args, only)
+            if only & {'api_image', 'api_image_raw', 'api_text'}:
+                results += await bench_web_api(args, only)
+        finally:
+            await runner.cleanup()
+
+    for result in results:
+        print(result.report())
+    print(f"\nupstream requests: {json.dumps(stand_in.requests, sort_keys=True)}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({result.name: result.summary() for result in results}, f, indent=2)
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=1)
+    parser.add_argument('--only', default='', help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--json', default=None, help="save the results to this file")
+    parser.add_argument('--baseline', default=None, help="compare against results saved with --json")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed p95 increase, 0.2 = 20%%")
+    standin.add_arguments(parser)
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == '__main__':
+    main()
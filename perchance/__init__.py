@@ -1,3 +1,51 @@
+import importlib
+from typing import TYPE_CHECKING, Any
+
 from .errors import *
-from .imagegen import *
-from .textgen import *
\ No newline at end of file
+from .browser import *
+from .cache import *
+from .keystore import *
+from .timeouts import *
+from .retry import *
+from .hooks import *
+from .metrics import *
+from .sse import *
+from . import browser, cache, errors, hooks, keystore, metrics, retry, sse, timeouts
+
+if TYPE_CHECKING:
+    from .aigen import AIGenerator, KeySlot
+    from .imagegen import ImageGenerator, ImageResponse
+    from .textgen import TextGenerator, TextStream
+
+
+# the generators pull in aiohttp, they are imported on first use
+_LAZY: dict[str, str] = {
+    'AIGenerator': 'aigen',
+    'KeySlot': 'aigen',
+    'ImageGenerator': 'imagegen',
+    'ImageResponse': 'imagegen',
+    'TextGenerator': 'textgen',
+    'TextStream': 'textgen'
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY))
+
+
+# the public names of the submodules, and the generators imported on first use
+__all__ = [
+    name
+    for module in (errors, browser, cache, keystore, timeouts, retry, hooks, metrics, sse)
+    for name in module.__all__
+] + list(_LAZY)
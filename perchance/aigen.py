@@ -1,36 +1,609 @@
 import aiohttp
+import asyncio
+import logging
 import random
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Literal
+
+from . import errors, metrics
+from .browser import BrowserManager
+from .hooks import GeneratorHooks
+from .keystore import FileKeyStore, KeyStore, StoredKey
+from .retry import RetryPolicy, RetryState
+from .timeouts import Deadline, Timeouts
+from .utils import SingleFlight
+
+if TYPE_CHECKING:
+    from playwright.async_api import Response
+
+
+__all__ = ['AIGenerator', 'KeySlot']
+
+
+logger = logging.getLogger(__name__)
+
+class KeySlot:
+    """State of one user key in a generator's key pool."""
+
+    def __init__(self, index: int) -> None:
+        self.index: int = index
+        self.key: str | None = None
+        # UNIX time, shared with other processes through the key store
+        self.fetched_at: float = 0.0
+        # monotonic times
+        self.checked_at: float = 0.0
+        self.last_used: float = 0.0
+        self.cooldown_until: float = 0.0
+        self.in_flight: int = 0
+
+    def __repr__(self) -> str:
+        return f"<KeySlot index={self.index} in_flight={self.in_flight} cooling_down={self.cooling_down}>"
+
+    @property
+    def cooling_down(self) -> bool:
+        """Whether the key is resting after being rate limited."""
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def key_age(self) -> float | None:
+        """Seconds since the key was fetched."""
+        if self.key is None:
+            return None
+        return time.time() - self.fetched_at
+
+
+def _key_age_reader(slot: KeySlot):
+    # the registry must not keep discarded generators alive
+    ref = weakref.ref(slot)
+
+    def read() -> float | None:
+        slot = ref()
+        return slot.key_age if slot is not None else None
+
+    return read
 
 
 class AIGenerator:
+    """
+    Base class for AI generators.
+
+    Parameters
+    ----------
+    session: `aiohttp.ClientSession` | `None`
+        Session to send requests with. If not provided, the generator
+        creates its own session on first use and closes it in `aclose()`.
+    limit: `int`
+        Total number of simultaneous connections. `0` means no limit.
+    limit_per_host: `int`
+        Number of simultaneous connections to a single host. `0` means no limit.
+    keepalive_timeout: `float`
+        Seconds an idle connection is kept open for reuse.
+    ttl_dns_cache: `int` | `None`
+        Seconds resolved hosts are cached for. `None` caches forever.
+    key_ttl: `float`
+        Seconds a fetched or verified user key is trusted without asking
+        the server again.
+    browser: `BrowserManager` | `None`
+        Browser used to fetch user keys. If not provided, a browser is
+        launched for every key fetch and closed afterwards.
+    key_store: `KeyStore` | `False` | `None`
+        Where user keys are shared with other generators and processes.
+        `None` uses a `FileKeyStore` at its default location and `False`
+        keeps the key in memory only.
+    pool_size: `int`
+        Number of independently fetched user keys requests are spread over.
+    pool_strategy: `str`
+        How a key is picked for a request. Can be either `least_in_flight`
+        or `lru` (least recently used).
+    retry_policy: `RetryPolicy` | `None`
+        How failed upstream requests are retried.
+    hooks: `GeneratorHooks` | `None`
+        Callbacks notified about the request lifecycle. Connection events
+        are only reported for the session the generator creates itself,
+        or for sessions created with `trace_config()`.
+    timeouts: `Timeouts` | `None`
+        Time budgets of the phases of a request.
+    """
+
     BASE_URL: str
+    PAGE_URL: str
+    GENERATE_BUTTON: str
+    STOP_BUTTON: str | None = None
+
+    # key fetches are shared by all generators of the same class and slot
+    _fetch_flight: SingleFlight = SingleFlight()
+
+    def __init__(
+        self,
+        *,
+        session: aiohttp.ClientSession | None = None,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 30.0,
+        ttl_dns_cache: int | None = 300,
+        key_ttl: float = 600.0,
+        browser: BrowserManager | None = None,
+        key_store: KeyStore | Literal[False] | None = None,
+        pool_size: int = 1,
+        pool_strategy: Literal['least_in_flight', 'lru'] = 'least_in_flight',
+        retry_policy: RetryPolicy | None = None,
+        hooks: GeneratorHooks | None = None,
+        timeouts: Timeouts | None = None
+    ) -> None:
+        if pool_size < 1:
+            raise ValueError(f"Invalid pool size: {pool_size}")
+        if pool_strategy not in ('least_in_flight', 'lru'):
+            raise ValueError(f"Invalid pool strategy: {pool_strategy}")
+
+        self._slots: list[KeySlot] = [KeySlot(i) for i in range(pool_size)]
+        self._pool_strategy: str = pool_strategy
+        self._key_ttl: float = key_ttl
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        self.hooks: GeneratorHooks = hooks if hooks is not None else GeneratorHooks()
+        self.timeouts: Timeouts = timeouts or Timeouts()
+        # phases are limited by deadlines, aiohttp only limits connecting
+        self._client_timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=self.timeouts.connect
+        )
+        # verification runs inside the shared refresh, it must end on its own
+        self._verify_timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(
+            total=self.timeouts.verify, sock_connect=self.timeouts.connect
+        )
+        self._refresh_flight: SingleFlight = SingleFlight()
+        self._browser: BrowserManager | None = browser
+        self._key_store: KeyStore | None = (
+            FileKeyStore() if key_store is None else key_store or None
+        )
+
+        self._session: aiohttp.ClientSession | None = session
+        self._owns_session: bool = session is None
+        self._limit: int = limit
+        self._limit_per_host: int = limit_per_host
+        self._keepalive_timeout: float = keepalive_timeout
+        self._ttl_dns_cache: int | None = ttl_dns_cache
+
+        for slot in self._slots:
+            metrics.KEY_AGE_SECONDS.set_function(
+                _key_age_reader(slot), generator=type(self).__name__, slot=slot.index
+            )
+
+    async def __aenter__(self) -> "AIGenerator":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it if needed."""
+        if self._session is None or (self._owns_session and self._session.closed):
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=self._ttl_dns_cache
+            )
+            trace_configs = (
+                [self.trace_config()] if self.hooks.on_dns or self.hooks.on_connection else None
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self._client_timeout,
+                trace_configs=trace_configs
+            )
+            self._owns_session = True
+
+        return self._session
 
-    def __init__(self) -> None:
-        self._key: str | None = None
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Trace config reporting connection timings to the hooks of the generator.
+
+        Example usage
+        -------------
+        ```python
+        gen = ImageGenerator(hooks=hooks)
+        session = aiohttp.ClientSession(trace_configs=[gen.trace_config()])
+        gen = ImageGenerator(hooks=hooks, session=session)
+        ```
+        """
+        trace = aiohttp.TraceConfig()
+
+        async def dns_start(session, ctx, params) -> None:
+            ctx.dns_started = time.perf_counter()
+
+        async def dns_end(session, ctx, params) -> None:
+            if self.hooks.on_dns:
+                await self.hooks.emit(
+                    self.hooks.on_dns, self,
+                    host=params.host,
+                    duration=time.perf_counter() - ctx.dns_started
+                )
+
+        async def connection_start(session, ctx, params) -> None:
+            ctx.connection_started = time.perf_counter()
+
+        async def connection_end(session, ctx, params) -> None:
+            if self.hooks.on_connection:
+                await self.hooks.emit(
+                    self.hooks.on_connection, self,
+                    duration=time.perf_counter() - ctx.connection_started,
+                    reused=False
+                )
+
+        async def connection_reused(session, ctx, params) -> None:
+            if self.hooks.on_connection:
+                await self.hooks.emit(self.hooks.on_connection, self, duration=0.0, reused=True)
+
+        trace.on_dns_resolvehost_start.append(dns_start)
+        trace.on_dns_resolvehost_end.append(dns_end)
+        trace.on_connection_create_start.append(connection_start)
+        trace.on_connection_create_end.append(connection_end)
+        trace.on_connection_reuseconn.append(connection_reused)
+
+        return trace
+
+    async def aclose(self) -> None:
+        """Close the session owned by the generator."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
 
     @classmethod
-    async def _fetch_key(cls) -> str:
-        """Fetch an user key from the website."""
-        raise NotImplementedError()
-    
+    async def _fetch_key_until(cls, browser: BrowserManager | None, deadline: Deadline) -> str:
+        """Fetch an user key, cancelling the fetch itself when the deadline passes."""
+        async with deadline.scope():
+            return await cls._fetch_key(browser)
+
     @classmethod
-    async def _verify_key(cls, key: str) -> bool:
+    async def _fetch_key(cls, browser: BrowserManager | None = None) -> str:
+        """Fetch an user key from the website."""
+        if browser is None:
+            async with BrowserManager(idle_timeout=0) as browser:
+                return await cls._fetch_key(browser)
+
+        def is_verify_response(response: "Response") -> bool:
+            return (
+                response.url.startswith(cls.BASE_URL + '/verifyUser')
+                and response.request.method != 'OPTIONS'
+            )
+
+        try:
+            async with browser.page() as page:
+                await page.goto(cls.PAGE_URL, wait_until='domcontentloaded')
+
+                iframe_element = await page.wait_for_selector('xpath=//iframe[@src]')
+                frame = await iframe_element.content_frame()
+
+                async with page.expect_response(is_verify_response, timeout=20000) as info:
+                    await frame.click(cls.GENERATE_BUTTON)
+
+                response = await info.value
+                data = await response.json()
+                key: str = data['userKey']
+
+                if cls.STOP_BUTTON is not None:
+                    await frame.click(cls.STOP_BUTTON)
+
+            return key
+        except Exception:
+            raise errors.ConnectionError()
+
+    async def _verify_key(self, key: str) -> bool:
         """Verify an user key."""
+        started = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    cls.BASE_URL + '/checkVerificationStatus',
-                    params={
-                        'userKey': key,
-                        '__cacheBust': random.random()
-                    }
-                ) as response:
-                    return 'not_verified' not in await response.text()
+            async with self._get_session().get(
+                self.BASE_URL + '/checkVerificationStatus',
+                params={
+                    'userKey': key,
+                    '__cacheBust': random.random()
+                },
+                timeout=self._verify_timeout
+            ) as response:
+                valid = 'not_verified' not in await response.text()
         except Exception:
+            valid = False
+            result = 'error'
+        else:
+            result = 'valid' if valid else 'invalid'
+
+        duration = time.perf_counter() - started
+        metrics.KEY_VERIFY_SECONDS.observe(duration, generator=type(self).__name__, result=result)
+        logger.debug(
+            "Key verification: %s", result,
+            extra={'event': 'key_verify', 'result': result, 'duration': duration}
+        )
+
+        if self.hooks.on_verify:
+            await self.hooks.emit(self.hooks.on_verify, self, valid=valid, duration=duration)
+
+        return valid
+
+    @property
+    def _key(self) -> str | None:
+        """Key of the first slot in the pool."""
+        return self._slots[0].key
+
+    def _store_name(self, slot: KeySlot) -> str:
+        return self.BASE_URL if slot.index == 0 else f"{self.BASE_URL}#{slot.index}"
+
+    def _key_is_fresh(self, slot: KeySlot) -> bool:
+        """Whether the key of the slot is still within its trust period."""
+        return (
+            slot.key is not None
+            and time.monotonic() - slot.checked_at < self._key_ttl
+        )
+
+    async def _invalidate_key(self, slot: KeySlot, key: str | None) -> None:
+        """Forget a key that was rejected by the server."""
+        if key is None:
+            return
+
+        if slot.key == key:
+            slot.key = None
+
+        if self._key_store is not None:
+            try:
+                await self._key_store.discard(self._store_name(slot), key)
+            except Exception:
+                pass
+
+    def _cool_down(self, slot: KeySlot, reason: int | str, retry_after: float | None = None) -> bool:
+        """
+        Stop using the key of the slot for a while if another key can serve
+        meanwhile, returning whether it was cooled down.
+
+        The rest lasts as long as the server asks in `Retry-After`, or the
+        delay of the retry rule for the reason.
+        """
+        now = time.monotonic()
+        if not any(other is not slot and other.cooldown_until <= now for other in self._slots):
+            # the only usable key, resting it would stall every request
             return False
-            
-    async def refresh(self) -> None:
-        """Verify and refresh the user key if needed."""
+
+        policy = self.retry_policy
+        if retry_after is not None and policy.respect_retry_after:
+            seconds = retry_after
+        else:
+            seconds = policy.rules.get(reason, policy.base_delay) or policy.base_delay
+
+        slot.cooldown_until = max(slot.cooldown_until, now + seconds)
+        return True
+
+    async def _backoff(
+        self,
+        state: RetryState,
+        kind: str,
+        reason: int | str,
+        retry_after: float | None = None,
+        slot: KeySlot | None = None
+    ) -> float:
+        """
+        Delay before retrying a failed request, raising if it is not retried.
+
+        A key that was rate limited or blocked rests instead if the `slot` is
+        given and another key can serve, and the retry is made right away.
+        """
+        if slot is not None and reason in (403, 429) and self._cool_down(slot, reason, retry_after):
+            delay = 0.0
+        else:
+            try:
+                delay = state.backoff(reason, retry_after)
+            except errors.ConnectionError:
+                logger.warning(
+                    "%s request failed after %d attempts: %s", kind, state.attempts, reason,
+                    extra={'event': 'give_up', 'kind': kind, 'reason': reason, 'attempt': state.attempts}
+                )
+                raise
+
+        logger.info(
+            "%s request failed (%s), retrying in %.2fs", kind, reason, delay,
+            extra={
+                'event': 'retry',
+                'kind': kind,
+                'reason': reason,
+                'delay': delay,
+                'attempt': state.attempts
+            }
+        )
+
+        if self.hooks.on_retry:
+            await self.hooks.emit(
+                self.hooks.on_retry, self,
+                kind=kind, reason=reason, delay=delay, attempt=state.attempts
+            )
+
+        return delay
+
+    async def _pick_slot(self) -> KeySlot:
+        """Pick a slot for the next request, waiting if every key is cooling down."""
+        while True:
+            now = time.monotonic()
+            ready = [slot for slot in self._slots if slot.cooldown_until <= now]
+
+            if ready:
+                if self._pool_strategy == 'lru':
+                    return min(ready, key=lambda slot: slot.last_used)
+                return min(ready, key=lambda slot: (slot.in_flight, slot.last_used))
+
+            await asyncio.sleep(min(slot.cooldown_until for slot in self._slots) - now)
+
+    @asynccontextmanager
+    async def _use_key(self, deadline: Deadline | None = None) -> AsyncIterator[KeySlot]:
+        """Reserve a slot with a valid key for the duration of a request."""
+        deadline = deadline or Deadline()
+
+        async with deadline.scope():
+            slot = await self._pick_slot()
+
+        slot.in_flight += 1
+        slot.last_used = time.monotonic()
+        metrics.REQUESTS_IN_FLIGHT.inc(generator=type(self).__name__)
+        try:
+            # the shared refresh bounds itself by `Timeouts.key_fetch`
+            async with deadline.scope():
+                await self._refresh_slot(slot)
+            yield slot
+        finally:
+            slot.in_flight -= 1
+            metrics.REQUESTS_IN_FLIGHT.dec(generator=type(self).__name__)
+
+    async def _load_stored_key(self, slot: KeySlot) -> StoredKey | None:
+        if self._key_store is None:
+            return None
+
+        try:
+            return await self._key_store.load(self._store_name(slot))
+        except Exception:
+            return None
+
+    async def _save_stored_key(self, slot: KeySlot) -> None:
+        if self._key_store is None or slot.key is None:
+            return
+
+        now = time.time()
+        stored = StoredKey(
+            key=slot.key,
+            fetched_at=slot.fetched_at,
+            verified_at=now - (time.monotonic() - slot.checked_at)
+        )
+
+        try:
+            await self._key_store.save(self._store_name(slot), stored)
+        except Exception:
+            pass
+
+    async def refresh(self, *, force: bool = False) -> None:
+        """
+        Verify and refresh the user keys if needed.
+
+        Parameters
+        ----------
+        force: `bool`
+            Verify the keys even if they are still within their trust period.
+        """
+        await asyncio.gather(*(
+            self._refresh_slot(slot, force=force) for slot in self._slots
+        ))
+
+    async def keep_fresh(
+        self,
+        *,
+        margin: float = 60.0,
+        interval: float | None = None,
+        retry_delay: float = 10.0
+    ) -> None:
+        """
+        Keep the user keys valid in the background until cancelled.
+
+        Every key is verified, and fetched again if it is no longer valid,
+        before its trust period ends, so requests never wait for it.
+
+        Parameters
+        ----------
+        margin: `float`
+            Seconds before the end of the trust period a key is refreshed.
+        interval: `float` | `None`
+            Refresh every key on this schedule instead, in seconds.
+        retry_delay: `float`
+            Seconds to wait after a failed refresh before trying again.
+
+        Example usage
+        -------------
+        ```python
+        task = asyncio.create_task(gen.keep_fresh())
+        ...
+        task.cancel()
+        ```
+        """
+        period = interval if interval is not None else max(0.0, self._key_ttl - margin)
+
+        while True:
+            now = time.monotonic()
+            due = [
+                slot for slot in self._slots
+                if slot.key is None or now - slot.checked_at >= period
+            ]
+
+            try:
+                await asyncio.gather(*(self._refresh_slot(slot, force=True) for slot in due))
+            except Exception as e:
+                logger.warning(
+                    "Background key refresh failed: %s: %s", type(e).__name__, e,
+                    extra={'event': 'key_refresh_failed'}
+                )
+                await asyncio.sleep(retry_delay)
+                continue
+
+            now = time.monotonic()
+            wait = min(slot.checked_at + period for slot in self._slots) - now
+            await asyncio.sleep(max(1.0, wait))
+
+    async def _refresh_slot(self, slot: KeySlot, *, force: bool = False) -> None:
+        if not force and self._key_is_fresh(slot):
+            return
+
+        # concurrent callers wait for the same refresh
+        await self._refresh_flight.do(slot.index, self._refresh_key, slot, force)
+
+    async def _refresh_key(self, slot: KeySlot, force: bool) -> None:
+        """Verify the key of the slot and fetch a new one if it is not valid."""
         cls = type(self)
-        if not self._key or not await cls._verify_key(self._key):
-            self._key = await cls._fetch_key()
+
+        # the shared refresh owns the key_fetch budget, callers only wait
+        # for it within their own deadline; the browser fetch is cancelled
+        # by the same deadline inside its flight, so a hung fetch ends too
+        deadline = Deadline().child(self.timeouts.key_fetch, 'key_fetch')
+
+        async with deadline.scope():
+            # another generator or process may have refreshed the key already
+            stored = await self._load_stored_key(slot)
+            if stored is not None:
+                checked_at = time.monotonic() - stored.age
+
+                if stored.key != slot.key:
+                    slot.key = stored.key
+                    slot.fetched_at = stored.fetched_at
+                    slot.checked_at = checked_at
+                else:
+                    slot.checked_at = max(slot.checked_at, checked_at)
+
+                if not force and self._key_is_fresh(slot):
+                    return
+
+            valid = bool(slot.key) and await self._verify_key(slot.key)
+
+        if valid:
+            slot.checked_at = time.monotonic()
+        else:
+            if self.hooks.on_key_fetch_start:
+                await self.hooks.emit(self.hooks.on_key_fetch_start, self, slot=slot)
+
+            started = time.perf_counter()
+            error: Exception | None = None
+            try:
+                slot.key = await AIGenerator._fetch_flight.do(
+                    (cls, slot.index), cls._fetch_key_until, self._browser, deadline
+                )
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                result = 'success' if error is None else 'error'
+                metrics.KEY_FETCH_SECONDS.observe(duration, generator=cls.__name__, result=result)
+                logger.info(
+                    "Key fetch for slot %d: %s in %.2fs", slot.index, result, duration,
+                    extra={'event': 'key_fetch', 'slot': slot.index, 'result': result, 'duration': duration}
+                )
+
+                if self.hooks.on_key_fetch_end:
+                    await self.hooks.emit(
+                        self.hooks.on_key_fetch_end, self, slot=slot, duration=duration, error=error
+                    )
+            slot.fetched_at = time.time()
+            slot.checked_at = time.monotonic()
+
+        await self._save_stored_key(slot)
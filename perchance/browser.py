@@ -0,0 +1,206 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    # Playwright is slow to import, it is loaded when the browser starts
+    from playwright.async_api import Browser, Page, Playwright, Route
+
+
+__all__ = ['BrowserManager']
+
+
+class BrowserManager:
+    """
+    Long-lived headless browser used to fetch user keys.
+
+    Playwright and the browser stay running between key fetches, and every
+    fetch gets a fresh browser context. The browser is restarted if it
+    crashed and shut down after being idle for `idle_timeout` seconds.
+    One manager can be shared by several generators.
+
+    Parameters
+    ----------
+    idle_timeout: `float` | `None`
+        Seconds without use after which the browser is shut down.
+        `None` keeps it running until `aclose()` is called.
+    headless: `bool`
+        Whether to run the browser without a window.
+    launch_args: `list[str]` | `None`
+        Extra command line arguments for the browser.
+    lean: `bool`
+        Abort requests for images, media, fonts and ad or analytics hosts,
+        which are not needed to obtain a key.
+
+    Example usage
+    -------------
+    ```python
+    async with BrowserManager(idle_timeout=600) as browser:
+        images = ImageGenerator(browser=browser)
+        texts = TextGenerator(browser=browser)
+    ```
+    """
+
+    LAUNCH_ARGS: list[str] = [
+        '--disable-web-security',
+        '--disable-features=IsolateOrigins,site-per-process',
+        '--disable-site-isolation-trials',
+        '--disable-webgl',
+        '--disable-gpu'
+    ]
+
+    BLOCKED_RESOURCE_TYPES: frozenset[str] = frozenset({
+        'image',
+        'imageset',
+        'media',
+        'font',
+        'texttrack',
+        'beacon',
+        'csp_report'
+    })
+
+    BLOCKED_HOSTS: tuple[str, ...] = (
+        'google-analytics.com',
+        'googletagmanager.com',
+        'googlesyndication.com',
+        'googleadservices.com',
+        'doubleclick.net',
+        'adservice.google.com',
+        'fundingchoicesmessages.google.com',
+        'cloudflareinsights.com'
+    )
+
+    def __init__(
+        self,
+        *,
+        idle_timeout: float | None = 300.0,
+        headless: bool = True,
+        launch_args: list[str] | None = None,
+        lean: bool = True
+    ) -> None:
+        self.idle_timeout: float | None = idle_timeout
+        self.headless: bool = headless
+        self.launch_args: list[str] = (
+            launch_args if launch_args is not None else self.LAUNCH_ARGS
+        )
+        self.lean: bool = lean
+
+        self._playwright: "Playwright | None" = None
+        self._browser: "Browser | None" = None
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._active: int = 0
+        self._idle_task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "BrowserManager":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the browser is currently running."""
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _start(self) -> "Browser":
+        """Start the browser, restarting it if it is not connected."""
+        async with self._lock:
+            if not self.is_running:
+                await self._stop()
+
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.firefox.launch(
+                    headless=self.headless,
+                    args=self.launch_args
+                )
+
+            return self._browser
+
+    async def _stop(self) -> None:
+        browser, self._browser = self._browser, None
+        playwright, self._playwright = self._playwright, None
+
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception:
+                pass
+
+    async def _route(self, route: "Route") -> None:
+        """Abort requests that are not needed to obtain a key."""
+        request = route.request
+        host = urlsplit(request.url).hostname or ''
+
+        if (
+            request.resource_type in self.BLOCKED_RESOURCE_TYPES
+            or host.endswith(self.BLOCKED_HOSTS)
+        ):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _close_when_idle(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+
+        async with self._lock:
+            if self._active == 0:
+                await self._stop()
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator["Page"]:
+        """Open a page in a new browser context."""
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            self._idle_task = None
+
+        self._active += 1
+        try:
+            browser = await self._start()
+            try:
+                context = await browser.new_context()
+            except Exception:
+                # the browser probably crashed, start a new one
+                async with self._lock:
+                    await self._stop()
+                browser = await self._start()
+                context = await browser.new_context()
+
+            if self.lean:
+                await context.route('**/*', self._route)
+
+            try:
+                yield await context.new_page()
+            finally:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        finally:
+            self._active -= 1
+
+            if self._active == 0 and self.idle_timeout is not None:
+                if self.idle_timeout <= 0:
+                    async with self._lock:
+                        await self._stop()
+                else:
+                    self._idle_task = asyncio.create_task(
+                        self._close_when_idle(self.idle_timeout)
+                    )
+
+    async def aclose(self) -> None:
+        """Shut down the browser."""
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            self._idle_task = None
+
+        async with self._lock:
+            await self._stop()
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from typing import Any
+
+from .utils import file_lock
+
+
+__all__ = ['CacheWriter', 'ImageCache']
+
+
+class CacheWriter:
+    """Writes one image into an `ImageCache` while it downloads."""
+
+    def __init__(self, cache: "ImageCache", key: str, metadata: dict[str, Any]) -> None:
+        self._cache: ImageCache = cache
+        self._key: str = key
+        self._metadata: dict[str, Any] = metadata
+        self._tmp: str = cache._path(key, f'.{uuid.uuid4().hex}.part')
+        self._file = None
+        self._size: int = 0
+
+    async def write(self, chunk: bytes) -> None:
+        if self._file is None:
+            import aiofiles
+
+            os.makedirs(self._cache.directory, exist_ok=True)
+            self._file = await aiofiles.open(self._tmp, 'wb')
+
+        await self._file.write(chunk)
+        self._size += len(chunk)
+
+    async def commit(self) -> None:
+        """Publish the written image in the cache."""
+        if self._file is None:
+            return
+
+        await self._file.close()
+        self._file = None
+        await asyncio.to_thread(self._cache._commit, self._key, self._tmp, self._metadata)
+
+    async def abort(self) -> None:
+        """Discard the written data."""
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+        try:
+            os.unlink(self._tmp)
+        except OSError:
+            pass
+
+
+class ImageCache:
+    """
+    On-disk cache of generated images.
+
+    Entries are content-addressed by the generation parameters, so only
+    requests with a fixed seed can hit the cache. Every entry consists of
+    the image bytes and a JSON file with the response metadata, both
+    written atomically. When the cache grows over `max_bytes`, the least
+    recently used entries are removed. Several processes can share one
+    cache directory.
+
+    Parameters
+    ----------
+    directory: `str` | `None`
+        Cache location. Defaults to the `PERCHANCE_IMAGE_CACHE` environment
+        variable or `~/.cache/perchance/images`.
+    max_bytes: `int`
+        Maximum total size of the cached images.
+    """
+
+    def __init__(self, directory: str | None = None, *, max_bytes: int = 1024 ** 3) -> None:
+        self.directory: str = directory or os.environ.get('PERCHANCE_IMAGE_CACHE') or os.path.join(
+            os.path.expanduser('~'), '.cache', 'perchance', 'images'
+        )
+        self.max_bytes: int = max_bytes
+
+    @staticmethod
+    def make_key(
+        *,
+        prompt: str,
+        negative_prompt: str | None,
+        resolution: str,
+        guidance_scale: float,
+        seed: int
+    ) -> str:
+        """Hash of the parameters that determine a generated image."""
+        params = [prompt, negative_prompt or '', resolution, float(guidance_scale), int(seed)]
+        return hashlib.sha256(json.dumps(params).encode()).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _lock(self):
+        return file_lock(os.path.join(self.directory, '.lock'))
+
+    def _get(self, key: str) -> tuple[bytes, dict[str, Any]] | None:
+        meta_path = self._path(key, '.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            with open(self._path(key, '.bin'), 'rb') as f:
+                data = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+        return data, metadata
+
+    def _commit(self, key: str, tmp: str, metadata: dict[str, Any]) -> None:
+        meta_tmp = self._path(key, f'.{uuid.uuid4().hex}.meta.part')
+
+        with self._lock():
+            try:
+                with open(meta_tmp, 'w', encoding='utf-8') as f:
+                    json.dump(metadata, f)
+                # the image goes first, an entry counts once its metadata exists
+                os.replace(tmp, self._path(key, '.bin'))
+                os.replace(meta_tmp, self._path(key, '.json'))
+            except BaseException:
+                for path in (tmp, meta_tmp):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                raise
+
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+
+            key = name[:-5]
+            try:
+                used = os.stat(self._path(key, '.json')).st_mtime
+                size = os.stat(self._path(key, '.bin')).st_size
+            except OSError:
+                continue
+
+            entries.append((used, size, key))
+            total += size
+
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+
+            for suffix in ('.json', '.bin'):
+                try:
+                    os.unlink(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
+
+    async def get(self, key: str) -> tuple[bytes, dict[str, Any]] | None:
+        """Return the image bytes and metadata stored under the key, if any."""
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, data: bytes, metadata: dict[str, Any]) -> None:
+        """Store an image under the key."""
+        writer = self.writer(key, metadata)
+        try:
+            await writer.write(data)
+            await writer.commit()
+        except BaseException:
+            await writer.abort()
+            raise
+
+    def writer(self, key: str, metadata: dict[str, Any]) -> CacheWriter:
+        """Start storing an image under the key chunk by chunk."""
+        return CacheWriter(self, key, metadata)
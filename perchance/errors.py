@@ -1,3 +1,13 @@
+__all__ = [
+    'BadRequestError',
+    'ConnectionError',
+    'TimeoutError',
+    'AuthError',
+    'NotFoundError',
+    'BatchItemError'
+]
+
+
 class BadRequestError(Exception):
     pass
 
@@ -6,9 +16,25 @@ class ConnectionError(Exception):
     pass
 
 
+class TimeoutError(ConnectionError):
+    """Request phase or deadline that ran out of time."""
+
+    def __init__(self, phase: str = 'deadline'):
+        super().__init__(f"Timed out: {phase}")
+        self.phase: str = phase
+
+
 class AuthError(Exception):
     pass
 
 
 class NotFoundError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class BatchItemError(Exception):
+    """Failure of a single item in a batch, tagged with its input index."""
+
+    def __init__(self, index: int, error: Exception):
+        super().__init__(f"Item {index} failed: {type(error).__name__}: {error}")
+        self.index: int = index
+        self.error: Exception = error
@@ -0,0 +1,101 @@
+import inspect
+import logging
+from typing import Any, Callable
+
+
+__all__ = ['GeneratorHooks']
+
+
+logger = logging.getLogger(__name__)
+
+
+class GeneratorHooks:
+    """
+    Callbacks notified about the request lifecycle of generators.
+
+    Every event is a list of callbacks, like `aiohttp.TraceConfig`. A
+    callback is called with the generator as its only positional argument
+    and the event fields as keyword arguments; it can be a plain function
+    or a coroutine function. Callbacks should accept `**kwargs`, so new
+    fields do not break them. Errors raised by callbacks are logged and
+    otherwise ignored. Events without callbacks cost next to nothing.
+
+    Events
+    ------
+    on_key_fetch_start: `slot`
+        A new user key is being fetched with the browser.
+    on_key_fetch_end: `slot`, `duration`, `error`
+        The key fetch finished; `error` is `None` if it succeeded.
+    on_verify: `valid`, `duration`
+        A user key was verified.
+    on_request_start: `kind`, `attempt`
+        An upstream request is sent; `kind` is `generate` or `download`.
+    on_retry: `kind`, `reason`, `delay`, `attempt`
+        A request failed and is retried after `delay` seconds.
+    on_response: `kind`, `status`, `duration`, `attempt`
+        An upstream response arrived; `status` is the HTTP status, or the
+        failure reason if there is no response.
+    on_download_chunk: `image_id`, `size`, `total`
+        A chunk of an image was downloaded.
+    on_text_chunk: `text`, `index`
+        A chunk of generated text was received.
+    on_dns: `host`, `duration`
+        A host name was resolved.
+    on_connection: `duration`, `reused`
+        A connection was acquired, either newly opened (including the TLS
+        handshake) or reused from the pool.
+
+    The connection events come from an `aiohttp.TraceConfig`; see
+    `AIGenerator.trace_config()`.
+
+    Example usage
+    -------------
+    ```python
+    hooks = GeneratorHooks()
+
+    async def on_retry(generator, *, reason, delay, **kwargs):
+        print(f"retrying in {delay:.1f}s: {reason}")
+
+    hooks.on_retry.append(on_retry)
+    gen = ImageGenerator(hooks=hooks)
+    ```
+    """
+
+    EVENTS: tuple[str, ...] = (
+        'on_key_fetch_start',
+        'on_key_fetch_end',
+        'on_verify',
+        'on_request_start',
+        'on_retry',
+        'on_response',
+        'on_download_chunk',
+        'on_text_chunk',
+        'on_dns',
+        'on_connection'
+    )
+
+    def __init__(self) -> None:
+        self.on_key_fetch_start: list[Callable] = []
+        self.on_key_fetch_end: list[Callable] = []
+        self.on_verify: list[Callable] = []
+        self.on_request_start: list[Callable] = []
+        self.on_retry: list[Callable] = []
+        self.on_response: list[Callable] = []
+        self.on_download_chunk: list[Callable] = []
+        self.on_text_chunk: list[Callable] = []
+        self.on_dns: list[Callable] = []
+        self.on_connection: list[Callable] = []
+
+    def __repr__(self) -> str:
+        active = [event for event in self.EVENTS if getattr(self, event)]
+        return f"<GeneratorHooks active={active}>"
+
+    async def emit(self, callbacks: list[Callable], generator: Any, **fields: Any) -> None:
+        """Call the callbacks of an event."""
+        for callback in list(callbacks):
+            try:
+                result = callback(generator, **fields)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Hook %r failed", callback)
@@ -1,16 +1,26 @@
-import aiofiles
 import aiohttp
 import asyncio
 import io
+import json
+import logging
+import os
 import random
-from playwright.async_api import async_playwright, Request
-from typing import Literal
+import time
+import uuid
+from typing import Any, AsyncGenerator, AsyncIterable, AsyncIterator, Iterable, Literal
 
-from . import errors
+from . import errors, metrics
 from .aigen import AIGenerator
-from .utils import timeout
+from .cache import CacheWriter, ImageCache
+from .retry import parse_retry_after
+from .timeouts import Deadline
 
 
+__all__ = ['ImageGenerator', 'ImageResponse']
+
+
+logger = logging.getLogger(__name__)
+
 class ImageResponse:
     def __init__(
         self, 
@@ -24,7 +34,8 @@ class ImageResponse:
         height: int,
         guidance_scale: float,
         negative_prompt: str | None,
-        maybe_nsfw: bool
+        maybe_nsfw: bool,
+        attempts: int = 1
     ):
         self._generator: ImageGenerator = generator
         self._raw_image: io.BytesIO | None = None
@@ -38,6 +49,11 @@ class ImageResponse:
         self.guidance_scale: float = guidance_scale
         self.negative_prompt: str | None = negative_prompt
         self.maybe_nsfw: bool = maybe_nsfw
+        self.attempts: int = attempts
+        # position in the input of `ImageGenerator.images()`
+        self.index: int | None = None
+        self.from_cache: bool = False
+        self._cache_key: str | None = None
     
     def __str__(self) -> str:
         return f"{self.image_id}.{self.file_ext}"
@@ -49,58 +65,264 @@ class ImageResponse:
         if self._raw_image:
             self._raw_image.close()
 
+    @classmethod
+    def _from_cache(
+        cls,
+        generator: "ImageGenerator",
+        data: bytes,
+        metadata: dict[str, Any]
+    ) -> "ImageResponse":
+        response = cls(
+            generator=generator,
+            image_id=metadata['image_id'],
+            file_ext=metadata['file_ext'],
+            seed=metadata['seed'],
+            prompt=metadata['prompt'],
+            width=metadata['width'],
+            height=metadata['height'],
+            guidance_scale=metadata['guidance_scale'],
+            negative_prompt=metadata['negative_prompt'],
+            maybe_nsfw=metadata['maybe_nsfw'],
+            attempts=0
+        )
+        response._raw_image = io.BytesIO(data)
+        response.from_cache = True
+        return response
+
+    def _metadata(self) -> dict[str, Any]:
+        return {
+            'image_id': self.image_id,
+            'file_ext': self.file_ext,
+            'seed': self.seed,
+            'prompt': self.prompt,
+            'width': self.width,
+            'height': self.height,
+            'guidance_scale': self.guidance_scale,
+            'negative_prompt': self.negative_prompt,
+            'maybe_nsfw': self.maybe_nsfw
+        }
+
     @property
     def size(self) -> tuple[int, int]:
         """Size of the image."""
         return self.width, self.height
 
-    async def download(self) -> io.BytesIO:
-        """Download the image."""
+    async def _open(self, deadline: Deadline) -> aiohttp.ClientResponse:
+        """Request the image, retrying until the server starts sending it."""
+        state = self._generator.retry_policy.start(deadline)
+        delay: float = 0.0
+
+        while True:
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            state.attempt()
+            generator = self._generator
+
+            if generator.hooks.on_request_start:
+                await generator.hooks.emit(
+                    generator.hooks.on_request_start, generator, kind='download', attempt=state.attempts
+                )
+
+            started = time.perf_counter()
+            try:
+                async with deadline.scope():
+                    response = await generator._get_session().get(
+                        ImageGenerator.BASE_URL + '/downloadTemporaryImage',
+                        headers={
+                            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                            'Accept': 'application/json, text/plain, */*',
+                            'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
+                            'Accept-Encoding': 'gzip, deflate, br',
+                            'Referer': 'https://perchance.org/ai-text-to-image-generator',
+                            'Origin': 'https://perchance.org',
+                            'Connection': 'keep-alive',
+                            'Sec-Fetch-Dest': 'empty',
+                            'Sec-Fetch-Mode': 'cors',
+                            'Sec-Fetch-Site': 'same-site'
+                        },
+                        params={
+                            'imageId': self.image_id
+                        },
+                        timeout=generator._client_timeout
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = 'connection'
+                response = None
+            else:
+                status = response.status
+
+            if generator.hooks.on_response:
+                await generator.hooks.emit(
+                    generator.hooks.on_response, generator,
+                    kind='download',
+                    status=status,
+                    duration=time.perf_counter() - started,
+                    attempt=state.attempts
+                )
+
+            if response is None:
+                delay = await generator._backoff(state, 'download', status)
+                continue
+
+            if response.status != 200:
+                response.release()
+                delay = await generator._backoff(
+                    state,
+                    'download',
+                    response.status,
+                    parse_retry_after(response.headers.get('Retry-After'))
+                )
+                continue
+
+            return response
+
+    async def iter_chunks(
+        self,
+        chunk_size: int = 64 * 1024,
+        *,
+        cache: bool = False,
+        deadline: Deadline | float | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Download the image piece by piece.
+
+        Parameters
+        ----------
+        chunk_size: `int`
+            Maximum size of a chunk in bytes.
+        cache: `bool`
+            Also keep the image in memory, so `download()` and later
+            iterations do not download it again.
+        deadline: `Deadline` | `float` | `None`
+            Deadline of the download, or seconds until it. Raises
+            `errors.TimeoutError` when it passes.
+        """
+        if self._raw_image is not None:
+            data = memoryview(self._raw_image.getvalue())
+            for start in range(0, len(data), chunk_size):
+                yield bytes(data[start:start + chunk_size])
+            return
+
+        buffer = io.BytesIO() if cache else None
+        writer: CacheWriter | None = None
+
+        if self._generator.cache is not None and self._cache_key is not None:
+            writer = self._generator.cache.writer(self._cache_key, self._metadata())
+
+        hooks = self._generator.hooks
+        deadline = Deadline.of(deadline).child(self._generator.timeouts.download, 'download')
+        started = time.perf_counter()
+        size = 0
+
+        try:
+            async with await self._open(deadline) as response:
+                try:
+                    while True:
+                        async with deadline.scope():
+                            chunk = await response.content.read(chunk_size)
+
+                        if not chunk:
+                            break
+
+                        size += len(chunk)
+
+                        if hooks.on_download_chunk:
+                            await hooks.emit(
+                                hooks.on_download_chunk, self._generator,
+                                image_id=self.image_id, size=len(chunk), total=size
+                            )
+
+                        if buffer is not None:
+                            buffer.write(chunk)
+
+                        if writer is not None:
+                            try:
+                                await writer.write(chunk)
+                            except OSError:
+                                # caching is best effort
+                                await writer.abort()
+                                writer = None
+
+                        yield chunk
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    raise errors.ConnectionError()
+
+            metrics.DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+            metrics.DOWNLOAD_BYTES.observe(size)
+
+            if writer is not None:
+                try:
+                    await writer.commit()
+                except OSError:
+                    pass
+                writer = None
+        finally:
+            if writer is not None:
+                await writer.abort()
+
+        if buffer is not None:
+            buffer.seek(0)
+            self._raw_image = buffer
+
+    async def download(self, *, deadline: Deadline | float | None = None) -> io.BytesIO:
+        """
+        Download the image and keep it in memory.
+
+        Parameters
+        ----------
+        deadline: `Deadline` | `float` | `None`
+            Deadline of the download, or seconds until it. Raises
+            `errors.TimeoutError` when it passes.
+        """
         if self._raw_image is None:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    ImageGenerator.BASE_URL + '/downloadTemporaryImage',
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Accept': 'application/json, text/plain, */*',
-                        'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'Referer': 'https://perchance.org/ai-text-to-image-generator',
-                        'Origin': 'https://perchance.org',
-                        'Connection': 'keep-alive',
-                        'Sec-Fetch-Dest': 'empty',
-                        'Sec-Fetch-Mode': 'cors',
-                        'Sec-Fetch-Site': 'same-site'
-                    },
-                    params={
-                        'imageId': self.image_id
-                    }
-                ) as response:
-                    try:
-                        raw = await response.content.read()
-                        image = io.BytesIO(raw)
-                        image.seek(0)
-                        self._raw_image = image
-                    except Exception:
-                        raise errors.ConnectionError()
-                    
+            async for _ in self.iter_chunks(cache=True, deadline=deadline):
+                pass
+
         return self._raw_image
-                
-    async def save(self, filename: str | None = None) -> None:
+
+    async def save(
+        self,
+        filename: str | None = None,
+        *,
+        cache: bool = False,
+        deadline: Deadline | float | None = None
+    ) -> None:
         """
         Download and save the image.
 
+        The image is written to disk while it downloads, into a temporary
+        file that replaces the output file once complete.
+
         Parameters
         ----------
         filename: `str` | `None`
             Name of the output file.
+        cache: `bool`
+            Also keep the image in memory.
+        deadline: `Deadline` | `float` | `None`
+            Deadline of the download, or seconds until it.
         """
-        file = filename or f"{self.image_id}.{self.file_ext}" 
+        import aiofiles
+
+        file = filename or f"{self.image_id}.{self.file_ext}"
+        directory, name = os.path.split(os.path.abspath(file))
+
+        tmp = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.part")
+
+        try:
+            async with aiofiles.open(tmp, 'wb') as f:
+                async for chunk in self.iter_chunks(cache=cache, deadline=deadline):
+                    await f.write(chunk)
+
+            os.replace(tmp, file)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
 
-        async with aiofiles.open(file, 'wb') as f:
-            img = await self.download()
-            await f.write(img.read())
-            
 
 class ImageGenerator(AIGenerator):
     """
@@ -117,62 +339,23 @@ class ImageGenerator(AIGenerator):
         image = Image.open(raw)
         image.show()
     ```
-    """
 
-    BASE_URL = "https://image-generation.perchance.org/api"
+    Parameters
+    ----------
+    cache: `ImageCache` | `None`
+        Cache for images generated with a fixed seed.
 
-    @classmethod
-    async def _fetch_key(cls) -> str:
-        try:
-            key: str | None = None
-
-            async with async_playwright() as pw:
-                #browser = await pw.firefox.launch(headless=True)
-                browser = await pw.firefox.launch(
-                    headless=True,
-                    args=[
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process',
-                        '--disable-site-isolation-trials',
-                        '--disable-webgl',
-                        '--disable-gpu'
-                    ],
-                    #slow_mo=5000
-                )
-                page = await browser.new_page()
-
-                async def on_request(request: Request):
-                    if request.url.startswith(cls.BASE_URL + '/verifyUser'):
-                        try:
-                            nonlocal key
-
-                            resp = await request.response()
-                            data = await resp.json()
-                            #print("API response:", data)
-
-                            key = data['userKey']
-                        except Exception:
-                            pass
-
-                page.on("request", on_request)
-
-                await page.goto("https://perchance.org/ai-text-to-image-generator")
-
-                iframe_element = await page.query_selector('xpath=//iframe[@src]')
-                frame = await iframe_element.content_frame()
-
-                await frame.click('xpath=//button[@id="generateButtonEl"]')
+    Other keyword arguments are passed to `AIGenerator`.
+    """
 
-                async with timeout(20.0, errors.ConnectionError) as t:
-                    while not key:
-                        await t.tick()
-                        await asyncio.sleep(0.1)
+    BASE_URL = "https://image-generation.perchance.org/api"
+    PAGE_URL = "https://perchance.org/ai-text-to-image-generator"
+    GENERATE_BUTTON = 'xpath=//button[@id="generateButtonEl"]'
 
-                await browser.close()
+    def __init__(self, *, cache: ImageCache | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
 
-                return key
-        except Exception:
-            raise errors.ConnectionError()
+        self.cache: ImageCache | None = cache
 
     async def image(
         self,
@@ -181,7 +364,8 @@ class ImageGenerator(AIGenerator):
         negative_prompt: str | None = None,
         seed: int = -1,
         shape: Literal['portrait', 'square', 'landscape'] = 'landscape',
-        guidance_scale: float = 7.0
+        guidance_scale: float = 7.0,
+        deadline: Deadline | float | None = None
     ) -> ImageResponse:
         """
         Generate image.
@@ -198,11 +382,10 @@ class ImageGenerator(AIGenerator):
             Image shape. Can be either `portrait`, `square` or `landscape`.
         guidance_scale: `float`
             Accuracy of the prompt in range `1-30`. 
+        deadline: `Deadline` | `float` | `None`
+            Deadline of the generation, or seconds until it. Raises
+            `errors.TimeoutError` when it passes.
         """
-        await self.refresh()
-
-        image_id: str | None = None
-
         if shape == 'portrait':
             resolution = '512x768'
         elif shape == 'square':
@@ -212,106 +395,299 @@ class ImageGenerator(AIGenerator):
         else:
             raise ValueError(f"Invalid shape: {shape}")
 
-        async with aiohttp.ClientSession() as session:
-            async with timeout(20.0, errors.ConnectionError) as t:
-                while image_id is None:
-                    await t.tick()
-                    
-                    async with session.post(
-                        ImageGenerator.BASE_URL + '/generate',
-                        headers={
-                            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                            'Accept': 'application/json, text/plain, */*',
-                            'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
-                            'Accept-Encoding': 'gzip, deflate, br',
-                            'Referer': 'https://perchance.org/ai-text-to-image-generator',
-                            'Origin': 'https://perchance.org',
-                            'Connection': 'keep-alive',
-                            'Sec-Fetch-Dest': 'empty',
-                            'Sec-Fetch-Mode': 'cors',
-                            'Sec-Fetch-Site': 'same-site',
-                            'Cache-Control': 'no-cache',
-                            'Pragma': 'no-cache'
-                        },
-                        params={
-                            'prompt': prompt,
-                            'negativePrompt': negative_prompt or '',
-                            'userKey': self._key,
-                            '__cache_bust': random.random(),
-                            'seed': seed,
-                            'resolution': resolution,
-                            'guidanceScale': guidance_scale,
-                            'channel': 'ai-text-to-image-generator',
-                            'subChannel': 'public',
-                            'requestId': random.random()
-                        }
-                    ) as response:
-                        try:
-                            # 添加除錯日誌
-                            #print(f"🔍 HTTP狀態碼: {response.status}")
-                            #print(f"🔍 回應標頭: {dict(response.headers)}")
-                            
-                            # 檢查 HTTP 狀態碼
-                            if response.status == 403:
-                                print("❌ 收到 403 Forbidden，可能被防爬蟲機制阻擋")
-                                print("💡 建議檢查 User-Agent 和請求標頭")
-                                await asyncio.sleep(5.0)  # 等待更長時間再重試
-                                continue
-                            elif response.status == 429:
-                                print("❌ 收到 429 Too Many Requests，請求過於頻繁")
-                                await asyncio.sleep(10.0)  # 等待更長時間
-                                continue
-                            elif response.status != 200:
-                                print(f"❌ 收到非正常狀態碼: {response.status}")
-                                await asyncio.sleep(4.0)
-                                continue
-                            
-                            # 獲取原始回應文本進行除錯
-                            response_text = await response.text()
-                            #print(f"🔍 回應內容: {response_text[:500]}...")  # 只顯示前500字符
-                            
-                            # 檢查回應是否為空
-                            if not response_text.strip():
-                                print("❌ 回應內容為空")
-                                await asyncio.sleep(4.0)
-                                continue
-                            
-                            # 嘗試解析JSON
-                            try:
-                                import json
-                                body = json.loads(response_text)
-                                #print(f"✅ JSON解析成功: {body}")
-                            except json.JSONDecodeError as json_err:
-                                print(f"❌ JSON解析失敗: {json_err}")
-                                print(f"❌ 無法解析的內容: {response_text}")
-                                await asyncio.sleep(4.0)
-                                continue
-                            
-                            status = body.get('status', 'unknown')
-                            #print(f"🔍 API狀態: {status}")
-                        except Exception as e:
-                            print(f"❌ 處理回應時發生錯誤: {type(e).__name__}: {str(e)}")
-                            await asyncio.sleep(4.0)
-                            continue
-
-                        if status == 'invalid_key':
+        if self.cache is not None and seed != -1:
+            hit = await self.cache.get(ImageCache.make_key(
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                resolution=resolution,
+                guidance_scale=guidance_scale,
+                seed=seed
+            ))
+            if hit is not None:
+                return ImageResponse._from_cache(self, *hit)
+
+        deadline = Deadline.of(deadline)
+        session = self._get_session()
+        state = self.retry_policy.start(deadline)
+        key_retried: bool = False
+        delay: float = 0.0
+
+        try:
+            while True:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = 0.0
+
+                state.attempt()
+
+                async with self._use_key(deadline) as slot:
+                    key = slot.key
+                    retry_after: float | None = None
+                    reason: int | str | None = None
+                    body: dict = {}
+                    started = time.perf_counter()
+
+                    if self.hooks.on_request_start:
+                        await self.hooks.emit(
+                            self.hooks.on_request_start, self, kind='generate', attempt=state.attempts
+                        )
+
+                    try:
+                        async with deadline.scope(self.timeouts.generate, 'generate'):
+                            async with session.post(
+                                ImageGenerator.BASE_URL + '/generate',
+                                headers={
+                                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                                    'Accept': 'application/json, text/plain, */*',
+                                    'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
+                                    'Accept-Encoding': 'gzip, deflate, br',
+                                    'Referer': 'https://perchance.org/ai-text-to-image-generator',
+                                    'Origin': 'https://perchance.org',
+                                    'Connection': 'keep-alive',
+                                    'Sec-Fetch-Dest': 'empty',
+                                    'Sec-Fetch-Mode': 'cors',
+                                    'Sec-Fetch-Site': 'same-site',
+                                    'Cache-Control': 'no-cache',
+                                    'Pragma': 'no-cache'
+                                },
+                                params={
+                                    'prompt': prompt,
+                                    'negativePrompt': negative_prompt or '',
+                                    'userKey': key,
+                                    '__cache_bust': random.random(),
+                                    'seed': seed,
+                                    'resolution': resolution,
+                                    'guidanceScale': guidance_scale,
+                                    'channel': 'ai-text-to-image-generator',
+                                    'subChannel': 'public',
+                                    'requestId': random.random()
+                                },
+                                timeout=self._client_timeout
+                            ) as response:
+                                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+                                try:
+                                    # 檢查 HTTP 狀態碼
+                                    if response.status == 403:
+                                        # 可能被防爬蟲機制阻擋，檢查 User-Agent 和請求標頭
+                                        reason = 403
+                                    elif response.status == 429:
+                                        # 請求過於頻繁
+                                        reason = 429
+                                    elif response.status != 200:
+                                        reason = response.status
+                                    else:
+                                        response_text = await response.text()
+
+                                        # 檢查回應是否為空
+                                        if not response_text.strip():
+                                            reason = 'empty'
+                                        else:
+                                            # 嘗試解析JSON
+                                            try:
+                                                body = json.loads(response_text)
+                                            except json.JSONDecodeError as json_err:
+                                                logger.debug(
+                                                    "Invalid JSON: %s: %r", json_err, response_text[:500],
+                                                    extra={'event': 'invalid_json', 'attempt': state.attempts}
+                                                )
+                                                reason = 'invalid_json'
+                                except Exception as e:
+                                    logger.warning(
+                                        "Error while handling the response: %s: %s", type(e).__name__, e,
+                                        extra={'event': 'response_error', 'attempt': state.attempts}
+                                    )
+                                    reason = 'error'
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.debug(
+                            "Connection failed: %s: %s", type(e).__name__, e,
+                            extra={'event': 'connection_error', 'attempt': state.attempts}
+                        )
+                        reason = 'connection'
+                    except errors.TimeoutError as e:
+                        if e.phase == 'deadline':
+                            raise
+                        # the attempt hung, free the slot and try again
+                        reason = 'timeout'
+
+                    duration = time.perf_counter() - started
+                    outcome = reason if reason is not None else body.get('status', 'unknown')
+
+                    metrics.GENERATE_SECONDS.observe(duration, generator=type(self).__name__)
+                    metrics.UPSTREAM_RESPONSES.inc(generator=type(self).__name__, reason=outcome)
+
+                    if outcome != 'success':
+                        logger.warning(
+                            "/generate failed: %s (attempt %d)", outcome, state.attempts,
+                            extra={
+                                'event': 'generate_failed',
+                                'reason': outcome,
+                                'slot': slot.index,
+                                'attempt': state.attempts,
+                                'duration': duration
+                            }
+                        )
+
+                    if self.hooks.on_response:
+                        await self.hooks.emit(
+                            self.hooks.on_response, self,
+                            kind='generate', status=outcome, duration=duration, attempt=state.attempts
+                        )
+
+                    if reason is not None:
+                        # a rate limited key rests if another one can serve
+                        delay = await self._backoff(state, 'generate', reason, retry_after, slot)
+                        continue
+
+                    status = body.get('status', 'unknown')
+
+                    if status == 'invalid_key':
+                        if key_retried:
                             raise errors.AuthError()
-                        elif status == 'invalid_data':
-                            raise errors.BadRequestError()
-                        elif status != 'success':
-                            await asyncio.sleep(4.0)
-                            continue
-
-                        return ImageResponse(
-                            generator=self,
-                            image_id=body['imageId'],
-                            file_ext=body['fileExtension'],
-                            seed=body['seed'],
+
+                        # the key expired earlier than expected,
+                        # fetch a new one and try again once
+                        key_retried = True
+                        await self._invalidate_key(slot, key)
+                        continue
+                    elif status == 'invalid_data':
+                        raise errors.BadRequestError()
+                    elif status != 'success':
+                        delay = await self._backoff(state, 'generate', status)
+                        continue
+
+                    result = ImageResponse(
+                        generator=self,
+                        image_id=body['imageId'],
+                        file_ext=body['fileExtension'],
+                        seed=body['seed'],
+                        prompt=prompt,
+                        width=body['width'],
+                        height=body['height'],
+                        guidance_scale=guidance_scale,
+                        negative_prompt=negative_prompt,
+                        maybe_nsfw=body['maybeNsfw'],
+                        attempts=state.attempts
+                    )
+
+                    if self.cache is not None:
+                        # stored under the actual seed, so random seeds can be replayed
+                        result._cache_key = ImageCache.make_key(
                             prompt=prompt,
-                            width=body['width'],
-                            height=body['height'],
-                            guidance_scale=guidance_scale,
                             negative_prompt=negative_prompt,
-                            maybe_nsfw=body['maybeNsfw']
+                            resolution=resolution,
+                            guidance_scale=guidance_scale,
+                            seed=body['seed']
                         )
-                        
\ No newline at end of file
+
+                    return result
+        finally:
+            metrics.GENERATE_ATTEMPTS.observe(state.attempts, generator=type(self).__name__)
+
+    async def images(
+        self,
+        requests: Iterable[str | dict[str, Any]] | AsyncIterable[str | dict[str, Any]],
+        *,
+        concurrency: int = 4,
+        download: bool = False,
+        return_exceptions: bool = True
+    ) -> AsyncGenerator["ImageResponse | errors.BatchItemError", None]:
+        """
+        Generate many images with bounded concurrency.
+
+        Results are yielded as soon as they complete, so their order may
+        differ from the input; `ImageResponse.index` tells the position of
+        the request it belongs to. The input is consumed lazily, only a few
+        requests ahead of the running ones.
+
+        Parameters
+        ----------
+        requests: `Iterable` | `AsyncIterable`
+            Prompts, or dicts of keyword arguments for `image()`.
+        concurrency: `int`
+            Maximum number of images generated at the same time.
+        download: `bool`
+            Download every image before yielding it.
+        return_exceptions: `bool`
+            Yield a failed item as `errors.BatchItemError` instead of
+            raising its failure and stopping the batch. The raised
+            exception is chained from the `errors.BatchItemError`, whose
+            `index` tells the failed item.
+
+        Example usage
+        -------------
+        ```python
+        prompts = (line.strip() for line in open("prompts.txt"))
+
+        async for result in gen.images(prompts, concurrency=8):
+            if isinstance(result, errors.BatchItemError):
+                print(f"{result.index} failed: {result.error}")
+            else:
+                await result.save(f"{result.index}.{result.file_ext}")
+        ```
+        """
+        if concurrency < 1:
+            raise ValueError(f"Invalid concurrency: {concurrency}")
+
+        pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+        async def feed() -> None:
+            index = 0
+            try:
+                if isinstance(requests, AsyncIterable):
+                    async for spec in requests:
+                        await pending.put((index, spec))
+                        index += 1
+                else:
+                    for spec in requests:
+                        await pending.put((index, spec))
+                        index += 1
+            except Exception:
+                # let the started items finish, the error is raised afterwards
+                for _ in range(concurrency):
+                    await pending.put(None)
+                raise
+
+            for _ in range(concurrency):
+                await pending.put(None)
+
+        async def work() -> None:
+            while (item := await pending.get()) is not None:
+                index, spec = item
+                try:
+                    kwargs = {'prompt': spec} if isinstance(spec, str) else dict(spec)
+                    result = await self.image(**kwargs)
+                    result.index = index
+
+                    if download:
+                        await result.download()
+                except Exception as e:
+                    await results.put(errors.BatchItemError(index, e))
+                else:
+                    await results.put(result)
+
+            await results.put(None)
+
+        feeder = asyncio.create_task(feed())
+        workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+
+        try:
+            finished = 0
+            while finished < concurrency:
+                result = await results.get()
+
+                if result is None:
+                    finished += 1
+                elif isinstance(result, errors.BatchItemError) and not return_exceptions:
+                    # the wrapper still tells the index of the failed item
+                    raise result.error from result
+                else:
+                    yield result
+
+            # re-raise errors from iterating the input
+            await feeder
+        finally:
+            for task in (feeder, *workers):
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from .utils import file_lock
+
+
+__all__ = ['StoredKey', 'KeyStore', 'FileKeyStore']
+
+
+class StoredKey:
+    """
+    User key together with its timestamps.
+
+    Timestamps are UNIX times, so they can be compared across processes.
+    Perchance does not tell when a key expires; a generator trusts a stored
+    key for `key_ttl` seconds after `verified_at` and verifies it again
+    afterwards, fetching a new one only if it is no longer valid.
+    """
+
+    def __init__(
+        self,
+        *,
+        key: str,
+        fetched_at: float,
+        verified_at: float | None = None
+    ) -> None:
+        self.key: str = key
+        self.fetched_at: float = fetched_at
+        self.verified_at: float = verified_at if verified_at is not None else fetched_at
+
+    def __repr__(self) -> str:
+        return f"<StoredKey fetched_at={self.fetched_at} verified_at={self.verified_at}>"
+
+    @property
+    def age(self) -> float:
+        """Seconds since the key was last fetched or verified."""
+        return time.time() - self.verified_at
+
+    def to_dict(self) -> dict:
+        return {
+            'key': self.key,
+            'fetched_at': self.fetched_at,
+            'verified_at': self.verified_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StoredKey":
+        return cls(
+            key=data['key'],
+            fetched_at=data['fetched_at'],
+            verified_at=data.get('verified_at')
+        )
+
+
+class KeyStore:
+    """
+    Storage for user keys shared between generators, processes and restarts.
+
+    Keys are stored under a name, one key per name.
+    """
+
+    async def load(self, name: str) -> StoredKey | None:
+        """Return the key stored under the name, if any."""
+        raise NotImplementedError()
+
+    async def save(self, name: str, key: StoredKey) -> None:
+        """Store a key under the name."""
+        raise NotImplementedError()
+
+    async def discard(self, name: str, key: str) -> None:
+        """Remove the key stored under the name if it is still the given key."""
+        raise NotImplementedError()
+
+
+class FileKeyStore(KeyStore):
+    """
+    Key store backed by a JSON file.
+
+    Writes replace the file atomically and every access holds an exclusive
+    lock on a sidecar `.lock` file, so several processes can share it.
+
+    Parameters
+    ----------
+    path: `str` | `None`
+        Location of the file. Defaults to the `PERCHANCE_KEY_STORE`
+        environment variable or `~/.cache/perchance/keys.json`.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path: str = path or os.environ.get('PERCHANCE_KEY_STORE') or os.path.join(
+            os.path.expanduser('~'), '.cache', 'perchance', 'keys.json'
+        )
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        return data if isinstance(data, dict) else {}
+
+    def _write(self, data: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix='.keys-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _load(self, name: str) -> StoredKey | None:
+        with file_lock(self.path + '.lock'):
+            entry = self._read().get(name)
+
+        try:
+            return StoredKey.from_dict(entry) if entry else None
+        except (KeyError, TypeError):
+            return None
+
+    def _save(self, name: str, key: StoredKey) -> None:
+        with file_lock(self.path + '.lock'):
+            data = self._read()
+            data[name] = key.to_dict()
+            self._write(data)
+
+    def _discard(self, name: str, key: str) -> None:
+        with file_lock(self.path + '.lock'):
+            data = self._read()
+            entry = data.get(name)
+            if isinstance(entry, dict) and entry.get('key') == key:
+                del data[name]
+                self._write(data)
+
+    async def load(self, name: str) -> StoredKey | None:
+        return await asyncio.to_thread(self._load, name)
+
+    async def save(self, name: str, key: StoredKey) -> None:
+        await asyncio.to_thread(self._save, name, key)
+
+    async def discard(self, name: str, key: str) -> None:
+        await asyncio.to_thread(self._discard, name, key)
@@ -0,0 +1,409 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+__all__ = [
+    'DEFAULT_BUCKETS',
+    'Metric',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'Registry',
+    'REGISTRY',
+    'KEY_FETCH_SECONDS',
+    'KEY_VERIFY_SECONDS',
+    'KEY_AGE_SECONDS',
+    'REQUESTS_IN_FLIGHT',
+    'GENERATE_SECONDS',
+    'GENERATE_ATTEMPTS',
+    'UPSTREAM_RESPONSES',
+    'DOWNLOAD_SECONDS',
+    'DOWNLOAD_BYTES',
+    'TEXT_FIRST_CHUNK_SECONDS',
+    'TEXT_CHUNK_RATE'
+]
+
+
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ''
+
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        )
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """
+    Base class for metrics.
+
+    Every combination of label values is a separate series. Label values
+    are passed as keyword arguments and must cover all label names.
+    """
+
+    TYPE: str
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.help: str = help
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+        self._values: dict[tuple[str, ...], Any] = {}
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} name={self.name!r}>"
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"Expected labels {self.labelnames}, got {tuple(labels)}")
+
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            raise ValueError(f"Expected labels {self.labelnames}, got {tuple(labels)}")
+
+    def remove(self, **labels: Any) -> None:
+        """Drop the series with the given label values."""
+        self._values.pop(self._key(labels), None)
+
+    def _samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        help = self.help.replace('\\', '\\\\').replace('\n', '\\n')
+        lines = [
+            f"# HELP {self.name} {help}",
+            f"# TYPE {self.name} {self.TYPE}"
+        ]
+
+        for suffix, names, values, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class _ScalarMetric(Metric):
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._functions: dict[tuple[str, ...], Callable[[], float | None]] = {}
+
+    def set_function(self, func: Callable[[], float | None], **labels: Any) -> None:
+        """
+        Read the value of a series from a function when rendered.
+
+        The series is left out while the function returns `None`.
+        """
+        self._functions[self._key(labels)] = func
+
+    def remove(self, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values.pop(key, None)
+        self._functions.pop(key, None)
+
+    def value(self, **labels: Any) -> float:
+        """Current value of a series."""
+        key = self._key(labels)
+        if key in self._functions:
+            value = self._functions[key]()
+            return math.nan if value is None else value
+
+        return self._values.get(key, 0.0)
+
+    def _samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        for key, value in list(self._values.items()):
+            if key not in self._functions:
+                yield '', self.labelnames, key, value
+
+        for key, func in list(self._functions.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+
+            if value is not None:
+                yield '', self.labelnames, key, value
+
+
+class Counter(_ScalarMetric):
+    """
+    Value that only goes up.
+
+    Example usage
+    -------------
+    ```python
+    responses = REGISTRY.counter('responses_total', 'Responses by status.', ('status',))
+    responses.inc(status=429)
+    ```
+    """
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Increase a series by the amount."""
+        if amount < 0:
+            raise ValueError(f"Counters can only increase, got {amount}")
+
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_ScalarMetric):
+    """Value that can go up and down."""
+
+    TYPE = 'gauge'
+
+    def set(self, value: float, **labels: Any) -> None:
+        """Set a series to the value."""
+        self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Increase a series by the amount."""
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """Decrease a series by the amount."""
+        self.inc(-amount, **labels)
+
+
+class _HistogramSeries:
+    def __init__(self, buckets: int) -> None:
+        self.counts: list[int] = [0] * buckets
+        self.sum: float = 0.0
+        self.count: int = 0
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Parameters
+    ----------
+    buckets: `tuple`
+        Upper bounds of the buckets, in increasing order. The `+Inf`
+        bucket is always added.
+
+    Example usage
+    -------------
+    ```python
+    latency = REGISTRY.histogram('request_seconds', 'Request latency.')
+
+    with latency.time():
+        await send_request()
+    ```
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+
+        if list(buckets) != sorted(buckets):
+            raise ValueError(f"Buckets must be in increasing order: {buckets}")
+
+        self.buckets: tuple[float, ...] = tuple(float(b) for b in buckets if not math.isinf(b))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record an observed value."""
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = _HistogramSeries(len(self.buckets))
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series.counts[i] += 1
+                break
+
+        series.sum += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the seconds spent in the block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        """Number of observed values in a series."""
+        series = self._values.get(self._key(labels))
+        return series.count if series is not None else 0
+
+    def sum(self, **labels: Any) -> float:
+        """Sum of observed values in a series."""
+        series = self._values.get(self._key(labels))
+        return series.sum if series is not None else 0.0
+
+    def _samples(self) -> Iterator[tuple[str, tuple[str, ...], tuple[str, ...], float]]:
+        names = self.labelnames + ('le',)
+
+        for key, series in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                yield '_bucket', names, key + (_format_value(bound),), cumulative
+
+            yield '_bucket', names, key + ('+Inf',), series.count
+            yield '_sum', self.labelnames, key, series.sum
+            yield '_count', self.labelnames, key, series.count
+
+
+class Registry:
+    """
+    Collection of metrics rendered together.
+
+    The `counter()`, `gauge()` and `histogram()` methods return the
+    already registered metric when called again with the same name, so
+    modules can declare the metrics they use independently.
+
+    Example usage
+    -------------
+    ```python
+    registry = Registry()
+    hits = registry.counter('cache_hits_total', 'Cache hits.')
+    hits.inc()
+
+    print(registry.render())
+    ```
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def __iter__(self) -> Iterator[Metric]:
+        return iter(list(self._metrics.values()))
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, raising if another metric has the same name."""
+        existing = self._metrics.get(metric.name)
+        if existing is not None and existing is not metric:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        """Remove a metric."""
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Metric | None:
+        """Return the metric with the name, if any."""
+        return self._metrics.get(name)
+
+    def _get_or_create(self, cls: type, name: str, *args, **kwargs) -> Any:
+        existing = self._metrics.get(name)
+        if existing is not None:
+            if type(existing) is not cls:
+                raise ValueError(f"Metric {name} is a {existing.TYPE}, not a {cls.TYPE}")
+            return existing
+
+        return self.register(cls(name, *args, **kwargs))
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        return ''.join(metric.render() for metric in self)
+
+
+# registry the generators report to
+REGISTRY: Registry = Registry()
+
+KEY_FETCH_SECONDS: Histogram = REGISTRY.histogram(
+    'perchance_key_fetch_seconds',
+    'Time spent fetching a user key with the browser.',
+    ('generator', 'result')
+)
+KEY_VERIFY_SECONDS: Histogram = REGISTRY.histogram(
+    'perchance_key_verify_seconds',
+    'Time spent verifying a user key.',
+    ('generator', 'result')
+)
+KEY_AGE_SECONDS: Gauge = REGISTRY.gauge(
+    'perchance_key_age_seconds',
+    'Seconds since the user key of a pool slot was fetched.',
+    ('generator', 'slot')
+)
+REQUESTS_IN_FLIGHT: Gauge = REGISTRY.gauge(
+    'perchance_requests_in_flight',
+    'Upstream requests holding a user key.',
+    ('generator',)
+)
+GENERATE_SECONDS: Histogram = REGISTRY.histogram(
+    'perchance_generate_seconds',
+    'Latency of a single /generate attempt.',
+    ('generator',)
+)
+GENERATE_ATTEMPTS: Histogram = REGISTRY.histogram(
+    'perchance_generate_attempts',
+    'Attempts made per generation, including the first one.',
+    ('generator',),
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+UPSTREAM_RESPONSES: Counter = REGISTRY.counter(
+    'perchance_upstream_responses_total',
+    'Upstream /generate outcomes by HTTP status or failure reason.',
+    ('generator', 'reason')
+)
+DOWNLOAD_SECONDS: Histogram = REGISTRY.histogram(
+    'perchance_download_seconds',
+    'Time spent downloading a generated image.'
+)
+DOWNLOAD_BYTES: Histogram = REGISTRY.histogram(
+    'perchance_download_bytes',
+    'Size of downloaded images.',
+    buckets=tuple(2.0 ** n * 1024 for n in range(4, 14))
+)
+TEXT_FIRST_CHUNK_SECONDS: Histogram = REGISTRY.histogram(
+    'perchance_text_first_chunk_seconds',
+    'Time from the start of a text stream to its first chunk.'
+)
+TEXT_CHUNK_RATE: Histogram = REGISTRY.histogram(
+    'perchance_text_chunks_per_second',
+    'Chunks per second received after the first chunk of a text stream.',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
@@ -0,0 +1,204 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from . import errors
+from .timeouts import Deadline
+
+
+__all__ = ['parse_retry_after', 'RetryPolicy', 'RetryState']
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Convert a `Retry-After` header to seconds."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Rules for retrying failed upstream requests.
+
+    The delay before a retry grows exponentially with the number of attempts
+    made so far, starting from the delay of the failure reason, and is
+    randomized by `jitter` so that concurrent requests do not retry in lockstep.
+
+    Parameters
+    ----------
+    max_attempts: `int` | `None`
+        Maximum number of attempts, including the first one.
+    total_budget: `float` | `None`
+        Maximum seconds spent on a request including retries.
+    base_delay: `float`
+        Delay after the first failure for reasons without their own rule.
+    max_delay: `float`
+        Upper bound for a single delay, unless `Retry-After` asks for more.
+    multiplier: `float`
+        Factor the delay grows by after every attempt.
+    jitter: `float`
+        Fraction of the delay that is randomized, in range `0-1`.
+    respect_retry_after: `bool`
+        Wait at least as long as the server asks in `Retry-After`.
+    rules: `dict` | `None`
+        Delay after the first failure per HTTP status or failure reason.
+        `None` as a delay means the failure is not retried.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int | None = None,
+        total_budget: float | None = 20.0,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        respect_retry_after: bool = True,
+        rules: dict[int | str, float | None] | None = None
+    ) -> None:
+        if not 0.0 <= jitter <= 1.0:
+            raise ValueError(f"Invalid jitter: {jitter}")
+
+        self.max_attempts: int | None = max_attempts
+        self.total_budget: float | None = total_budget
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.multiplier: float = multiplier
+        self.jitter: float = jitter
+        self.respect_retry_after: bool = respect_retry_after
+        self.rules: dict[int | str, float | None] = (
+            rules if rules is not None else {403: 5.0, 429: 10.0}
+        )
+
+    def start(self, deadline: Deadline | None = None) -> "RetryState":
+        """
+        Start tracking the attempts of a new request.
+
+        Parameters
+        ----------
+        deadline: `Deadline` | `None`
+            Deadline of the request, which also ends its retries.
+        """
+        return RetryState(self, deadline)
+
+    def delay(
+        self,
+        attempts: int,
+        reason: int | str | None = None,
+        retry_after: float | None = None
+    ) -> float | None:
+        """
+        Delay before the next attempt, or `None` if the failure is not retried.
+
+        Parameters
+        ----------
+        attempts: `int`
+            Number of attempts made so far.
+        reason: `int` | `str` | `None`
+            HTTP status or name of the failure.
+        retry_after: `float` | `None`
+            Seconds the server asked to wait.
+        """
+        base = self.rules.get(reason, self.base_delay) if reason is not None else self.base_delay
+        if base is None:
+            return None
+
+        delay = min(self.max_delay, base * self.multiplier ** max(0, attempts - 1))
+        delay *= 1.0 - self.jitter * random.random()
+
+        if self.respect_retry_after and retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+
+class RetryState:
+    """Attempts made for one request under a `RetryPolicy`."""
+
+    def __init__(self, policy: RetryPolicy, deadline: Deadline | None = None) -> None:
+        self.policy: RetryPolicy = policy
+        self.deadline: Deadline | None = deadline
+        self.attempts: int = 0
+        self._started: float = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the request started."""
+        return time.monotonic() - self._started
+
+    @property
+    def remaining(self) -> float | None:
+        """Seconds left in the total budget or until the deadline."""
+        remaining = None
+        if self.policy.total_budget is not None:
+            remaining = self.policy.total_budget - self.elapsed
+
+        if self.deadline is not None and self.deadline.expires_at is not None:
+            until_deadline = self.deadline.remaining
+            remaining = until_deadline if remaining is None else min(remaining, until_deadline)
+
+        return remaining
+
+    def attempt(self) -> int:
+        """Register a new attempt, raising if no attempts are left."""
+        max_attempts = self.policy.max_attempts
+        if max_attempts is not None and self.attempts >= max_attempts:
+            raise errors.ConnectionError(f"Gave up after {self.attempts} attempts")
+
+        if self.deadline is not None and self.deadline.expired:
+            raise errors.TimeoutError()
+
+        remaining = self.remaining
+        if remaining is not None and remaining <= 0:
+            raise errors.ConnectionError(f"Gave up after {self.attempts} attempts")
+
+        self.attempts += 1
+        return self.attempts
+
+    def backoff(
+        self,
+        reason: int | str | None = None,
+        retry_after: float | None = None
+    ) -> float:
+        """
+        Delay before retrying after a failure.
+
+        Raises `errors.ConnectionError` if the failure is not retried or
+        the retry would not fit in the attempts or time budget.
+        """
+        delay = self.policy.delay(self.attempts, reason, retry_after)
+        if delay is None:
+            raise errors.ConnectionError(f"Request failed: {reason}")
+
+        max_attempts = self.policy.max_attempts
+        if max_attempts is not None and self.attempts >= max_attempts:
+            raise errors.ConnectionError(f"Gave up after {self.attempts} attempts: {reason}")
+
+        if self.deadline is not None and self.deadline.remaining is not None:
+            if delay >= self.deadline.remaining:
+                raise errors.TimeoutError()
+
+        remaining = self.remaining
+        if remaining is not None and delay >= remaining:
+            raise errors.ConnectionError(f"Gave up after {self.attempts} attempts: {reason}")
+
+        return delay
+
+    async def sleep(
+        self,
+        reason: int | str | None = None,
+        retry_after: float | None = None
+    ) -> None:
+        """Wait before retrying after a failure."""
+        await asyncio.sleep(self.backoff(reason, retry_after))
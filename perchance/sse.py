@@ -0,0 +1,197 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+
+__all__ = ['SSEEvent', 'SSEDecoder', 'iter_events']
+
+
+class SSEEvent:
+    """Event received from a server-sent events stream."""
+
+    TERMINAL_EVENTS: frozenset[str] = frozenset({'done', 'end', 'close'})
+
+    def __init__(
+        self,
+        *,
+        data: str,
+        event: str = 'message',
+        id: str | None = None,
+        retry: int | None = None
+    ) -> None:
+        self.data: str = data
+        self.event: str = event
+        self.id: str | None = id
+        self.retry: int | None = retry
+
+    def __repr__(self) -> str:
+        return f"<SSEEvent event={self.event!r} id={self.id!r} data={self.data[:40]!r}>"
+
+    @property
+    def is_terminal(self) -> bool:
+        """Whether the event marks the end of the stream."""
+        return self.event in self.TERMINAL_EVENTS or self.data == '[DONE]'
+
+    def json(self) -> Any:
+        """Parse the event data as JSON."""
+        return json.loads(self.data)
+
+
+class SSEDecoder:
+    """
+    Incremental parser for server-sent events.
+
+    Feed it the response body in chunks of any size. Bytes are buffered
+    until a full line is available, so frames and multi-byte UTF-8
+    characters split across chunks are reassembled. Line terminators never
+    occur inside UTF-8 sequences, so lines are decoded only once complete.
+
+    Example usage
+    -------------
+    ```python
+    decoder = SSEDecoder()
+
+    async for chunk in response.content.iter_any():
+        for event in decoder.feed(chunk):
+            print(event.data)
+
+    for event in decoder.flush():
+        print(event.data)
+    ```
+    """
+
+    def __init__(self) -> None:
+        self._buffer: bytearray = bytearray()
+        self._data: list[str] = []
+        self._event: str = ''
+        self._retry: int | None = None
+        self.last_event_id: str | None = None
+
+    def feed(self, chunk: bytes) -> list[SSEEvent]:
+        """Add a chunk of the stream and return the events it completed."""
+        buffer = self._buffer
+        events: list[SSEEvent] = []
+
+        if not buffer and chunk[-2:] == b'\n\n' and b'\r' not in chunk:
+            # fast path for chunks of whole LF-terminated frames, the common
+            # case: nothing is copied into the buffer, and frames of a single
+            # data line become events without parsing fields one by one
+            for frame in chunk[:-2].split(b'\n\n'):
+                if (
+                    frame[:5] == b'data:'
+                    and b'\n' not in frame
+                    and not self._data
+                    and not self._event
+                    and self._retry is None
+                ):
+                    value = frame[6:] if frame[5:6] == b' ' else frame[5:]
+                    events.append(SSEEvent(
+                        data=value.decode('utf-8', errors='replace'),
+                        id=self.last_event_id
+                    ))
+                else:
+                    lines = frame.split(b'\n')
+                    lines.append(b'')
+                    self._feed_lines(lines, events)
+
+            return events
+
+        # the buffered bytes hold no line end, except maybe a trailing CR
+        scan = max(0, len(buffer) - 1)
+        buffer += chunk
+
+        end = max(buffer.rfind(b'\n', scan), buffer.rfind(b'\r', scan))
+        if end == len(buffer) - 1 and buffer[end] == 0x0d:
+            # a trailing CR may be the first half of CRLF
+            end = max(buffer.rfind(b'\n', scan, end), buffer.rfind(b'\r', scan, end))
+        if end < 0:
+            return events
+
+        lines = buffer[:end + 1].splitlines()
+        del buffer[:end + 1]
+
+        self._feed_lines(lines, events)
+        return events
+
+    def _feed_lines(self, lines: list, events: list[SSEEvent]) -> None:
+        for line in lines:
+            if line.startswith(b'data:'):
+                # fast path for the most common field
+                value = line[6:] if line[5:6] == b' ' else line[5:]
+                self._data.append(value.decode('utf-8', errors='replace'))
+                continue
+
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+
+    def flush(self) -> list[SSEEvent]:
+        """Finish the stream, returning an event left without a closing blank line."""
+        events: list[SSEEvent] = []
+
+        if self._buffer:
+            line = self._buffer.rstrip(b'\r')
+            self._buffer = bytearray()
+
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+
+        return events
+
+    def _process_line(self, line: bytes | bytearray) -> SSEEvent | None:
+        if not line:
+            return self._dispatch()
+
+        if line[0] == 0x3a:  # ':' starts a comment
+            return None
+
+        name, sep, value = bytes(line).partition(b':')
+        if sep and value[:1] == b' ':
+            value = value[1:]
+
+        if name == b'data':
+            self._data.append(value.decode('utf-8', errors='replace'))
+        elif name == b'event':
+            self._event = value.decode('utf-8', errors='replace')
+        elif name == b'id':
+            if b'\0' not in value:
+                self.last_event_id = value.decode('utf-8', errors='replace')
+        elif name == b'retry':
+            if value.isdigit():
+                self._retry = int(value)
+
+        return None
+
+    def _dispatch(self) -> SSEEvent | None:
+        if not self._data:
+            self._event = ''
+            return None
+
+        event = SSEEvent(
+            data='\n'.join(self._data),
+            event=self._event or 'message',
+            id=self.last_event_id,
+            retry=self._retry
+        )
+
+        self._data = []
+        self._event = ''
+        self._retry = None
+
+        return event
+
+
+async def iter_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """Parse server-sent events from a stream of byte chunks."""
+    decoder = SSEDecoder()
+
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
+
+    for event in decoder.flush():
+        yield event
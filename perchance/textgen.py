@@ -1,13 +1,42 @@
 import aiohttp
 import asyncio
+import logging
 import random
-import json
+import time
+from contextlib import aclosing
 from typing import AsyncGenerator
-from playwright.async_api import async_playwright, Request
 
-from . import errors
+from . import errors, metrics
 from .aigen import AIGenerator
-from .utils import timeout
+from .retry import parse_retry_after
+from .sse import iter_events
+from .timeouts import Deadline
+
+
+__all__ = ['TextGenerator', 'TextStream']
+
+
+logger = logging.getLogger(__name__)
+
+class TextStream:
+    """State of one text generation in progress."""
+
+    def __init__(self, prompt: str) -> None:
+        self.prompt: str = prompt
+        self.started_at: float = time.monotonic()
+        self.first_chunk_at: float | None = None
+        self.chunks: int = 0
+        self.chars: int = 0
+
+    def __repr__(self) -> str:
+        return f"<TextStream chunks={self.chunks} chars={self.chars}>"
+
+    def _add(self, text: str) -> None:
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+
+        self.chunks += 1
+        self.chars += len(text)
 
 
 class TextGenerator(AIGenerator):
@@ -23,63 +52,52 @@ class TextGenerator(AIGenerator):
     async for chunk in gen.text(prompt):
         print(chunk)
     ```
-    """
-
-    BASE_URL = "https://text-generation.perchance.org/api"
-
-    def __init__(self) -> None:
-        super().__init__()
 
-        self._lock: asyncio.Lock = asyncio.Lock()
-        self.is_generating: bool = False
+    Parameters
+    ----------
+    max_streams: `int`
+        Number of texts generated at the same time. Further calls
+        wait until a stream finishes.
 
-    @classmethod
-    async def _fetch_key(cls) -> str:
-        try:
-            key: str | None = None
-
-            async with async_playwright() as pw:
-                browser = await pw.firefox.launch(headless=True)
-                page = await browser.new_page()
-
-                async def on_request(request: Request):
-                    if request.url.startswith(cls.BASE_URL + '/verifyUser'):
-                        try:
-                            resp = await request.response()
-                            data = await resp.json()
-
-                            nonlocal key
-                            key = data['userKey']
-                        except Exception:
-                            pass
+    Other keyword arguments are passed to `AIGenerator`.
+    """
 
-                page.on("request", on_request)
+    BASE_URL = "https://text-generation.perchance.org/api"
+    PAGE_URL = "https://perchance.org/ai-text-generator"
+    GENERATE_BUTTON = 'xpath=//button[@id="generateBtn"]'
+    STOP_BUTTON = 'xpath=//button[@id="stopBtn"]'
 
-                await page.goto("https://perchance.org/ai-text-generator")
+    def __init__(self, *, max_streams: int = 8, **kwargs) -> None:
+        super().__init__(**kwargs)
 
-                iframe_element = await page.query_selector('xpath=//iframe[@src]')
-                frame = await iframe_element.content_frame()
+        if max_streams < 1:
+            raise ValueError(f"Invalid max streams: {max_streams}")
 
-                await frame.click('xpath=//button[@id="generateBtn"]')
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_streams)
+        self.streams: set[TextStream] = set()
 
-                async with timeout(20.0, errors.ConnectionError) as t:
-                    while not key:
-                        await t.tick()
-                        await asyncio.sleep(0.1)
+    @property
+    def is_generating(self) -> bool:
+        """Whether any text is being generated."""
+        return bool(self.streams)
 
-                await frame.click('xpath=//button[@id="stopBtn"]')
+    @staticmethod
+    def _observe_stream(stream: TextStream, requested_at: float) -> None:
+        if stream.first_chunk_at is None:
+            return
 
-                await browser.close()
+        metrics.TEXT_FIRST_CHUNK_SECONDS.observe(stream.first_chunk_at - requested_at)
 
-            return key
-        except Exception:
-            raise errors.ConnectionError()
+        duration = time.monotonic() - stream.first_chunk_at
+        if stream.chunks > 1 and duration > 0:
+            metrics.TEXT_CHUNK_RATE.observe((stream.chunks - 1) / duration)
 
     async def text(
         self,
         prompt: str,
         *,
-        start_with: str | None = None
+        start_with: str | None = None,
+        deadline: Deadline | float | None = None
     ) -> AsyncGenerator[str, None]:
         """
         Generate text.
@@ -90,65 +108,189 @@ class TextGenerator(AIGenerator):
             Text instruction.
         start_with: `str` | `None`
             Text to start generation with.
+        deadline: `Deadline` | `float` | `None`
+            Deadline of the whole stream, or seconds until it. Raises
+            `errors.TimeoutError` when it passes.
         """
-        async with self._lock:
-            await self.refresh()
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    TextGenerator.BASE_URL + '/generate',
-                    headers={
-                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Accept': 'application/json, text/plain, */*',
-                        'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'Referer': 'https://perchance.org/ai-text-to-image-generator',
-                        'Origin': 'https://perchance.org',
-                        'Connection': 'keep-alive',
-                        'Sec-Fetch-Dest': 'empty',
-                        'Sec-Fetch-Mode': 'cors',
-                        'Sec-Fetch-Site': 'same-site'
-                    },
-                    params={
-                        'userKey': self._key,
-                        '__cacheBust': random.random(),
-                        'requestId': f"aiTextCompletion{random.randint(0, 2**30)}"
-                    },
-                    json={
-                        'generatorName': 'ai-text-generator',
-                        'instruction': prompt,
-                        'instructionTokenCount': 1,
-                        'startWith': start_with or '',
-                        'startWithTokenCount': 1,
-                        'stopSequences': []
-                    }
-                ) as response:
-                    if not response.ok:
+        deadline = Deadline.of(deadline)
+
+        async with self._semaphore:
+            state = self.retry_policy.start(deadline)
+            key_retried: bool = False
+            delay: float = 0.0
+
+            try:
+                while True:
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                        delay = 0.0
+
+                    state.attempt()
+
+                    async with self._use_key(deadline) as slot:
+                        key = slot.key
+                        started = time.monotonic()
+
+                        if self.hooks.on_request_start:
+                            await self.hooks.emit(
+                                self.hooks.on_request_start, self, kind='generate', attempt=state.attempts
+                            )
+
                         try:
-                            body = await response.json(content_type=None)
-                            status = body['status']
-                        except Exception:
-                            raise errors.ConnectionError()
-
-                        if status == 'invalid_key':
-                            raise errors.AuthError()
-                        elif status == 'invalid_data':
-                            raise errors.BadRequestError()
-                        else:
-                            raise errors.ConnectionError()
-
-                    try:
-                        self.is_generating = True
-
-                        async for data_chunk in response.content.iter_any():
-                            for line in data_chunk.decode().split('\n\n'):
-                                if len(line) == 0:
+                            async with deadline.scope(self.timeouts.generate, 'generate'):
+                                response = await self._get_session().post(
+                                    TextGenerator.BASE_URL + '/generate',
+                                    headers={
+                                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                                        'Accept': 'application/json, text/plain, */*',
+                                        'Accept-Language': 'en-US,en;q=0.9,zh-TW;q=0.8,zh;q=0.7',
+                                        'Accept-Encoding': 'gzip, deflate, br',
+                                        'Referer': 'https://perchance.org/ai-text-to-image-generator',
+                                        'Origin': 'https://perchance.org',
+                                        'Connection': 'keep-alive',
+                                        'Sec-Fetch-Dest': 'empty',
+                                        'Sec-Fetch-Mode': 'cors',
+                                        'Sec-Fetch-Site': 'same-site'
+                                    },
+                                    params={
+                                        'userKey': key,
+                                        '__cacheBust': random.random(),
+                                        'requestId': f"aiTextCompletion{random.randint(0, 2**30)}"
+                                    },
+                                    json={
+                                        'generatorName': 'ai-text-generator',
+                                        'instruction': prompt,
+                                        'instructionTokenCount': 1,
+                                        'startWith': start_with or '',
+                                        'startWithTokenCount': 1,
+                                        'stopSequences': []
+                                    },
+                                    timeout=self._client_timeout
+                                )
+                        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                            logger.debug(
+                                "Connection failed: %s: %s", type(e).__name__, e,
+                                extra={'event': 'connection_error', 'attempt': state.attempts}
+                            )
+                            metrics.UPSTREAM_RESPONSES.inc(generator=type(self).__name__, reason='connection')
+
+                            if self.hooks.on_response:
+                                await self.hooks.emit(
+                                    self.hooks.on_response, self,
+                                    kind='generate',
+                                    status='connection',
+                                    duration=time.monotonic() - started,
+                                    attempt=state.attempts
+                                )
+
+                            delay = await self._backoff(state, 'generate', 'connection')
+                            continue
+                        except errors.TimeoutError as e:
+                            if e.phase == 'deadline':
+                                raise
+
+                            # the attempt hung, free the slot and try again
+                            metrics.UPSTREAM_RESPONSES.inc(generator=type(self).__name__, reason='timeout')
+                            delay = await self._backoff(state, 'generate', 'timeout')
+                            continue
+
+                        duration = time.monotonic() - started
+                        metrics.GENERATE_SECONDS.observe(duration, generator=type(self).__name__)
+
+                        async with response:
+                            if not response.ok:
+                                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+                                try:
+                                    body = await response.json(content_type=None)
+                                    status = body['status']
+                                except Exception:
+                                    status = response.status
+
+                                metrics.UPSTREAM_RESPONSES.inc(generator=type(self).__name__, reason=status)
+                                logger.warning(
+                                    "/generate failed: %s (attempt %d)", status, state.attempts,
+                                    extra={
+                                        'event': 'generate_failed',
+                                        'reason': status,
+                                        'slot': slot.index,
+                                        'attempt': state.attempts,
+                                        'duration': duration
+                                    }
+                                )
+
+                                if self.hooks.on_response:
+                                    await self.hooks.emit(
+                                        self.hooks.on_response, self,
+                                        kind='generate', status=status, duration=duration, attempt=state.attempts
+                                    )
+
+                                if status == 'invalid_key':
+                                    if key_retried:
+                                        raise errors.AuthError()
+
+                                    # the key expired earlier than expected,
+                                    # fetch a new one and try again once
+                                    key_retried = True
+                                    await self._invalidate_key(slot, key)
+                                    continue
+                                elif status == 'invalid_data':
+                                    raise errors.BadRequestError()
+                                elif response.status in (403, 429):
+                                    # rest this key if another one can serve meanwhile
+                                    delay = await self._backoff(
+                                        state, 'generate', response.status, retry_after, slot
+                                    )
+                                    continue
+                                else:
+                                    delay = await self._backoff(state, 'generate', status, retry_after)
                                     continue
-                                
-                                data: dict = json.loads(line[5:])
-                                yield data['text']
-                    except Exception:
-                        raise errors.ConnectionError()
-                    finally:
-                        self.is_generating = False
-                    
\ No newline at end of file
+
+                            metrics.UPSTREAM_RESPONSES.inc(generator=type(self).__name__, reason='success')
+
+                            if self.hooks.on_response:
+                                await self.hooks.emit(
+                                    self.hooks.on_response, self,
+                                    kind='generate', status=response.status, duration=duration, attempt=state.attempts
+                                )
+
+                            stream = TextStream(prompt)
+                            self.streams.add(stream)
+
+                            try:
+                                events = iter_events(response.content.iter_any())
+
+                                async with aclosing(events):
+                                    budget, phase = self.timeouts.first_chunk, 'first_chunk'
+
+                                    while True:
+                                        async with deadline.scope(budget, phase):
+                                            event = await anext(events, None)
+
+                                        if event is None or event.is_terminal:
+                                            break
+
+                                        budget, phase = self.timeouts.idle, 'idle'
+
+                                        data: dict = event.json()
+                                        if data.get('text'):
+                                            stream._add(data['text'])
+
+                                            if self.hooks.on_text_chunk:
+                                                await self.hooks.emit(
+                                                    self.hooks.on_text_chunk, self,
+                                                    text=data['text'], index=stream.chunks - 1
+                                                )
+
+                                            yield data['text']
+                            except errors.TimeoutError:
+                                raise
+                            except Exception:
+                                raise errors.ConnectionError()
+                            finally:
+                                self.streams.discard(stream)
+                                self._observe_stream(stream, started)
+
+                        return
+            finally:
+                metrics.GENERATE_ATTEMPTS.observe(state.attempts, generator=type(self).__name__)
@@ -0,0 +1,199 @@
+import asyncio
+import time
+
+from . import errors
+
+
+__all__ = ['Deadline', 'Timeouts']
+
+
+class _NoScope:
+    """Scope without a time limit."""
+
+    async def __aenter__(self) -> "_NoScope":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_SCOPE = _NoScope()
+
+
+class _CancelScope:
+    """Cancels the current task when the time runs out and raises `errors.TimeoutError`."""
+
+    def __init__(self, expires_at: float, phase: str) -> None:
+        self._expires_at: float = expires_at
+        self._phase: str = phase
+        self._task: asyncio.Task | None = None
+        self._handle: asyncio.TimerHandle | None = None
+        self._fired: bool = False
+
+    async def __aenter__(self) -> "_CancelScope":
+        self._task = asyncio.current_task()
+        # the event loop clock is monotonic as well
+        loop = asyncio.get_running_loop()
+        self._handle = loop.call_at(
+            loop.time() + (self._expires_at - time.monotonic()), self._expire
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._handle.cancel()
+
+        if self._fired and exc_type is asyncio.CancelledError:
+            uncancel = getattr(self._task, 'uncancel', None)
+            # another cancellation arrived meanwhile, let it through
+            if uncancel is None or uncancel() == 0:
+                raise errors.TimeoutError(self._phase) from exc_val
+
+        return False
+
+    def _expire(self) -> None:
+        self._fired = True
+        self._task.cancel()
+
+
+class Deadline:
+    """
+    Point in time on the monotonic clock by which an operation must finish.
+
+    Work done under `scope()` is cancelled when the deadline passes and
+    raises `errors.TimeoutError` instead, so a hung call frees the
+    resources it holds right away.
+
+    Parameters
+    ----------
+    seconds: `float` | `None`
+        Seconds from now until the deadline. `None` never expires.
+
+    Example usage
+    -------------
+    ```python
+    deadline = Deadline(30)
+
+    async with deadline.scope(10, 'connect'):
+        await connect()
+
+    print(deadline.remaining)
+    ```
+    """
+
+    def __init__(self, seconds: float | None = None) -> None:
+        self.expires_at: float | None = (
+            time.monotonic() + seconds if seconds is not None else None
+        )
+        # reported when this deadline passes
+        self.phase: str = 'deadline'
+
+    def __repr__(self) -> str:
+        return f"<Deadline remaining={self.remaining}>"
+
+    @classmethod
+    def of(cls, deadline: "Deadline | float | None") -> "Deadline":
+        """Convert seconds or `None` to a deadline."""
+        return deadline if isinstance(deadline, Deadline) else cls(deadline)
+
+    @property
+    def remaining(self) -> float | None:
+        """Seconds left, or `None` if the deadline never expires."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed."""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def _expiry(self, seconds: float | None) -> float | None:
+        if seconds is None:
+            return self.expires_at
+
+        expires_at = time.monotonic() + seconds
+        return expires_at if self.expires_at is None else min(expires_at, self.expires_at)
+
+    def child(self, seconds: float | None, phase: str = 'deadline') -> "Deadline":
+        """
+        Deadline `seconds` from now, but not later than this one.
+
+        Parameters
+        ----------
+        seconds: `float` | `None`
+            Budget of the phase.
+        phase: `str`
+            Name of the phase, reported if its budget runs out first.
+        """
+        deadline = Deadline()
+        deadline.expires_at = self._expiry(seconds)
+        deadline.phase = phase if deadline.expires_at != self.expires_at else self.phase
+        return deadline
+
+    def scope(self, seconds: float | None = None, phase: str = 'deadline'):
+        """
+        Async context manager cancelling its body at the deadline, or after
+        `seconds` if that comes first.
+
+        Parameters
+        ----------
+        seconds: `float` | `None`
+            Budget of the phase.
+        phase: `str`
+            Name of the phase, reported in `errors.TimeoutError`.
+        """
+        expires_at = self._expiry(seconds)
+        if expires_at is None:
+            return _NO_SCOPE
+
+        if expires_at == self.expires_at:
+            # this deadline comes first
+            phase = self.phase
+        return _CancelScope(expires_at, phase)
+
+
+class Timeouts:
+    """
+    Time budgets of the phases of a request.
+
+    Every budget is in seconds, and `None` means no limit. A phase that
+    runs out of time raises `errors.TimeoutError`; failed `/generate`
+    attempts are retried while the retry policy and deadline allow.
+
+    Parameters
+    ----------
+    key_fetch: `float` | `None`
+        Waiting for a valid user key, including launching the browser.
+    verify: `float` | `None`
+        One key verification request.
+    connect: `float` | `None`
+        Opening a TCP connection.
+    generate: `float` | `None`
+        One `/generate` attempt, until the response headers for text or
+        the full response for images arrived.
+    download: `float` | `None`
+        Downloading an image, including retries.
+    first_chunk: `float` | `None`
+        Waiting for the first event of a text stream.
+    idle: `float` | `None`
+        Waiting for every further event of a text stream.
+    """
+
+    def __init__(
+        self,
+        *,
+        key_fetch: float | None = 60.0,
+        verify: float | None = 10.0,
+        connect: float | None = 10.0,
+        generate: float | None = 90.0,
+        download: float | None = 120.0,
+        first_chunk: float | None = 60.0,
+        idle: float | None = 30.0
+    ) -> None:
+        self.key_fetch: float | None = key_fetch
+        self.verify: float | None = verify
+        self.connect: float | None = connect
+        self.generate: float | None = generate
+        self.download: float | None = download
+        self.first_chunk: float | None = first_chunk
+        self.idle: float | None = idle
@@ -1,17 +1,110 @@
-import time
+import asyncio
+import os
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable, Iterator
+
+from . import errors
+from .timeouts import Deadline
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 
 class timeout:
+    """
+    Time limit for a block of code. Prefer `Deadline` in new code.
+
+    The block is cancelled when the time runs out and `exc` is raised
+    instead; `tick()` raises it as well once the time is up.
+    """
+
     def __init__(self, seconds: float, exc: Exception | None = None):
         self._exc = exc or TimeoutError()
-        self._timeout = time.time() + seconds
+        self._deadline = Deadline(seconds)
+        self._scope = None
 
     async def __aenter__(self) -> "timeout":
+        self._scope = self._deadline.scope()
+        await self._scope.__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        pass
+        try:
+            return await self._scope.__aexit__(exc_type, exc_val, exc_tb)
+        except errors.TimeoutError:
+            raise self._exc from exc_val
 
     async def tick(self):
-        if time.time() > self._timeout:
+        if self._deadline.expired:
             raise self._exc
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    Every caller that arrives while a call for its key is in flight awaits
+    that call and receives its result or exception.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call for the key is currently running."""
+        future = self._calls.get(key)
+        return future is not None and not future.done()
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any
+    ) -> Any:
+        """
+        Run `func(*args)` unless a call for the key is already running,
+        and wait for the result.
+
+        Cancelling one waiter does not cancel the shared call.
+        """
+        loop = asyncio.get_running_loop()
+        future = self._calls.get(key)
+
+        if future is None or future.done() or future.get_loop() is not loop:
+            future = asyncio.ensure_future(func(*args))
+            self._calls[key] = future
+
+            def _done(f: asyncio.Future) -> None:
+                if self._calls.get(key) is f:
+                    del self._calls[key]
+                # mark the exception as retrieved even if every waiter left
+                if not f.cancelled():
+                    f.exception()
+
+            future.add_done_callback(_done)
+
+        return await asyncio.shield(future)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on a file shared between processes."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    with open(path, 'a+b') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
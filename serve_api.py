@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+以正式環境模式啟動Perchance Web API服務
+
+多個工作行程、uvloop 事件迴圈與 httptools HTTP 解析器，不監看檔案變更。
+收到 SIGTERM 時停止接受新連線，等待進行中的請求與佇列中的工作完成後，
+關閉連線與瀏覽器再結束。
+
+用法:
+    python serve_api.py [--workers 4] [--port 8888] [--graceful-timeout 30]
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+
+# 確保可以導入perchance模組
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def available(module: str) -> bool:
+    """模組是否已安裝"""
+    return importlib.util.find_spec(module) is not None
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="以正式環境模式啟動Perchance Web API服務")
+    parser.add_argument("--app", default="web_api:app", help="ASGI 應用程式，預設 web_api:app")
+    parser.add_argument("--host", default=os.environ.get("PERCHANCE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PERCHANCE_PORT", "8888")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("PERCHANCE_WORKERS", str(os.cpu_count() or 1))),
+        help="工作行程數，預設為 CPU 核心數",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=["uvloop", "asyncio"],
+        default="uvloop" if available("uvloop") else "asyncio",
+        help="事件迴圈，已安裝 uvloop 時預設使用",
+    )
+    parser.add_argument(
+        "--http",
+        choices=["httptools", "h11"],
+        default="httptools" if available("httptools") else "h11",
+        help="HTTP 解析器，已安裝 httptools 時預設使用",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=float(os.environ.get("PERCHANCE_DRAIN_TIMEOUT", "30")),
+        help="關閉時等待進行中請求完成的最長秒數",
+    )
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true", help="不記錄每個請求")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """以正式環境模式啟動Web API服務"""
+    args = parse_args(argv)
+
+    import uvicorn
+
+    if args.loop == "asyncio" and not available("uvloop") and sys.platform != "win32":
+        print("⚠️ 未安裝 uvloop，使用 asyncio 事件迴圈")
+    if args.http == "h11" and not available("httptools"):
+        print("⚠️ 未安裝 httptools，使用 h11 解析器")
+
+    # 佇列中的工作與進行中的請求共用同一個等待時間
+    os.environ["PERCHANCE_DRAIN_TIMEOUT"] = str(args.graceful_timeout)
+
+    print("🚀 啟動Perchance Web API服務（正式環境模式）")
+    print(f"📡 http://{args.host}:{args.port}，{args.workers} 個工作行程，{args.loop} + {args.http}")
+    print("💡 收到 SIGTERM 或 Ctrl+C 時會等待進行中的生成完成後再結束\n")
+
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        access_log=not args.no_access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+圖片轉檔與縮圖
+
+在行程池中執行，不匯入 web_api，讓工作行程保持精簡。
+"""
+
+import functools
+import io
+from typing import Optional
+
+
+# 輸出格式與對應的 Pillow 格式名稱
+FORMATS = {
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "avif": "AVIF",
+}
+
+
+@functools.cache
+def supported_formats() -> tuple[str, ...]:
+    """目前安裝的 Pillow 能編碼的輸出格式，未安裝 Pillow 時為空"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return ()
+
+    supported = []
+    for name, pil_format in FORMATS.items():
+        # 實際編碼一張小圖，外掛已註冊但缺少編碼器時也能偵測
+        try:
+            Image.new("RGB", (8, 8)).save(io.BytesIO(), format=pil_format)
+        except Exception:
+            continue
+        supported.append(name)
+    return tuple(supported)
+
+
+def transform(
+    data: bytes,
+    format: str,
+    quality: int = 80,
+    max_dimension: Optional[int] = None,
+) -> tuple[bytes, int, int]:
+    """
+    轉換圖片格式並等比例縮小
+
+    回傳編碼後的位元組與寬高，品質對 PNG 無作用
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+
+        if max_dimension is not None and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        pil_format = FORMATS[format]
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        options = {"optimize": True} if pil_format == "PNG" else {"quality": quality}
+        if pil_format == "WEBP":
+            options["method"] = 4
+
+        output = io.BytesIO()
+        image.save(output, format=pil_format, **options)
+        return output.getvalue(), image.width, image.height
@@ -1,12 +1,27 @@
 import asyncio
 import base64
 import io
-from typing import Literal, Optional
-from fastapi import FastAPI, HTTPException
+import json
+import math
+import mimetypes
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Literal, Optional
+import aiohttp
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-import uvicorn
 import perchance
+from perchance.metrics import REGISTRY
+from perchance.utils import SingleFlight
+import transcode
 
 
 class ImageRequest(BaseModel):
@@ -16,6 +31,19 @@ class ImageRequest(BaseModel):
     seed: int = Field(-1, description="生成種子")
     shape: Literal['portrait', 'square', 'landscape'] = Field('square', description="圖片形狀")
     guidance_scale: float = Field(7.0, description="提示詞準確度，範圍 1-30")
+    format: Optional[Literal['jpeg', 'png', 'webp', 'avif']] = Field(
+        None, description="輸出格式，未指定時使用上游的格式"
+    )
+    quality: int = Field(80, ge=1, le=100, description="輸出品質，範圍 1-100，PNG 不適用")
+    max_dimension: Optional[int] = Field(
+        None, ge=16, le=4096, description="長邊的最大像素數，較大的圖片會等比例縮小"
+    )
+
+
+class TextRequest(BaseModel):
+    """文字生成請求參數"""
+    prompt: str = Field(..., description="文字指示")
+    start_with: Optional[str] = Field(None, description="生成內容的開頭文字")
 
 
 class ImageResponseData(BaseModel):
@@ -32,6 +60,14 @@ class ImageResponseData(BaseModel):
     maybe_nsfw: bool = Field(..., description="可能包含成人內容")
 
 
+class JobResponse(BaseModel):
+    """非同步工作狀態"""
+    job_id: str = Field(..., description="工作ID")
+    status: Literal['queued', 'running', 'done', 'failed'] = Field(..., description="工作狀態")
+    result: Optional[ImageResponseData] = Field(None, description="完成時的圖片資料")
+    error: Optional[str] = Field(None, description="失敗時的錯誤訊息")
+
+
 app = FastAPI(
     title="Perchance圖片生成API",
     description="使用Perchance AI生成圖片的Web API",
@@ -45,17 +81,307 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Image-Id",
+        "X-Seed",
+        "X-Width",
+        "X-Height",
+        "X-Guidance-Scale",
+        "X-Maybe-Nsfw",
+    ],
 )
 
-# 全域圖片生成器實例
+# 文字串流在這麼多秒內沒有新內容就中止
+TEXT_IDLE_TIMEOUT = float(os.environ.get("PERCHANCE_TEXT_IDLE_TIMEOUT", "30"))
+
+# 工作佇列設定
+JOB_QUEUE_SIZE = int(os.environ.get("PERCHANCE_JOB_QUEUE_SIZE", "100"))
+JOB_WORKERS = int(os.environ.get("PERCHANCE_JOB_WORKERS", "4"))
+JOB_TTL = float(os.environ.get("PERCHANCE_JOB_TTL", "600"))
+# 工作狀態存放的目錄，同一台主機上的所有工作行程共用
+JOB_DIR = os.environ.get("PERCHANCE_JOB_DIR") or os.path.join(tempfile.gettempdir(), "perchance-jobs")
+# 關閉時等待佇列中工作完成的最長秒數
+DRAIN_TIMEOUT = float(os.environ.get("PERCHANCE_DRAIN_TIMEOUT", "30"))
+
+# 轉檔用的行程數與轉檔結果快取的容量
+TRANSCODE_WORKERS = int(os.environ.get("PERCHANCE_TRANSCODE_WORKERS", "2"))
+VARIANT_CACHE_BYTES = int(os.environ.get("PERCHANCE_VARIANT_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# 較舊的 Python 不認得這些類型
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+# 金鑰預熱：啟動時先取得並驗證金鑰，之後在背景於到期前更新
+KEY_WARMUP = os.environ.get("PERCHANCE_KEY_WARMUP", "").lower() in ("1", "true", "yes")
+# 金鑰信任期結束前幾秒更新
+KEY_REFRESH_MARGIN = float(os.environ.get("PERCHANCE_KEY_REFRESH_MARGIN", "60"))
+# 設定後改為每隔固定秒數更新
+KEY_REFRESH_INTERVAL = (
+    float(os.environ["PERCHANCE_KEY_REFRESH_INTERVAL"])
+    if os.environ.get("PERCHANCE_KEY_REFRESH_INTERVAL") else None
+)
+
+# 全域生成器實例，共用連線池與瀏覽器
 generator = None
+text_generator = None
+http_session = None
+browser = None
+transcode_pool = None
+keys_ready = False
+key_task = None
+
+
+class Job:
+    """排入佇列的圖片生成工作"""
+
+    def __init__(self, request: ImageRequest):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.result: Optional[ImageResponseData] = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def to_response(self) -> JobResponse:
+        return JobResponse(job_id=self.id, status=self.status, result=self.result, error=self.error)
+
+
+class JobStore:
+    """
+    以檔案保存工作狀態
+
+    多個工作行程時，查詢可能落在沒有接收該工作的行程，從這裡讀取狀態
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, job_id: str) -> Optional[str]:
+        # 工作ID來自網址，只接受 uuid4().hex 的格式，避免讀取任意檔案
+        if len(job_id) != 32 or any(c not in "0123456789abcdef" for c in job_id):
+            return None
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, response: JobResponse):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(response.job_id)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(jsonable_encoder(response), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, job_id: str) -> Optional[JobResponse]:
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return JobResponse(**json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, job_id: str):
+        try:
+            os.unlink(self._path(job_id))
+        except OSError:
+            pass
+
+    def sweep(self, ttl: float):
+        """移除超過保留時間的檔案，例如先前執行留下的工作"""
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime > ttl:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+class JobQueue:
+    """固定數量的工作者處理有上限的工作佇列，狀態同時寫入共用的 JobStore"""
+
+    def __init__(self, size: int, workers: int, ttl: float, store: JobStore):
+        self.size = size
+        self.workers = workers
+        self.ttl = ttl
+        self.store = store
+        self.jobs: dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        # 平均每個工作花費的秒數，用來估計 Retry-After
+        self._avg_duration = 10.0
+
+    def start(self):
+        self.store.sweep(self.ttl)
+        self._queue = asyncio.Queue(maxsize=self.size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 0):
+        """等待佇列中的工作最多 timeout 秒後停止工作者"""
+        if self._queue is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ 關閉時仍有 {self.pending} 個工作未完成")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def retry_after(self) -> int:
+        """估計佇列騰出空位所需的秒數"""
+        return max(1, math.ceil(self._avg_duration * self.pending / self.workers))
+
+    def submit(self, request: ImageRequest) -> Job:
+        """加入工作，佇列已滿時引發 asyncio.QueueFull"""
+        self._cleanup()
+
+        job = Job(request)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        try:
+            self.store.save(job.to_response())
+        except OSError as e:
+            print(f"⚠️ 無法保存工作狀態: {job.id}: {e}")
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[JobResponse]:
+        """查詢工作狀態，其他工作行程接收的工作從 JobStore 讀取"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            if wait > 0 and not job.done.is_set():
+                try:
+                    await asyncio.wait_for(job.done.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            return job.to_response()
+
+        deadline = time.monotonic() + wait
+        while True:
+            response = await asyncio.to_thread(self.store.load, job_id)
+            if response is None or response.status in ("done", "failed") or time.monotonic() >= deadline:
+                return response
+            await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+
+    def _cleanup(self):
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+            self.store.remove(job_id)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            started = time.monotonic()
+            await self._save(job)
+
+            try:
+                result = await run_image_request(job.request)
+                job.result = await build_response_data(result, job.request)
+                job.status = "done"
+                print(f"✅ 工作完成: {job.id}")
+            except Exception as e:
+                job.error = f"圖片生成失敗: {e}"
+                job.status = "failed"
+                print(f"❌ 工作失敗: {job.id}: {e}")
+            finally:
+                job.finished_at = time.monotonic()
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - started)
+                await self._save(job)
+                job.done.set()
+                self._queue.task_done()
+
+    async def _save(self, job: Job):
+        try:
+            await asyncio.to_thread(self.store.save, job.to_response())
+        except OSError as e:
+            print(f"⚠️ 無法保存工作狀態: {job.id}: {e}")
+
+
+job_queue = JobQueue(JOB_QUEUE_SIZE, JOB_WORKERS, JOB_TTL, JobStore(JOB_DIR))
+
+
+async def keep_keys_fresh():
+    """預熱金鑰，完成後在背景持續於到期前更新"""
+    global keys_ready
+    while True:
+        try:
+            await asyncio.gather(generator.refresh(), text_generator.refresh())
+            break
+        except Exception as e:
+            print(f"⚠️ 金鑰預熱失敗，10秒後重試: {e}")
+            await asyncio.sleep(10)
+
+    keys_ready = True
+    print("🔑 金鑰預熱完成，服務已就緒")
+
+    await asyncio.gather(*(
+        gen.keep_fresh(margin=KEY_REFRESH_MARGIN, interval=KEY_REFRESH_INTERVAL)
+        for gen in (generator, text_generator)
+    ))
 
 
 @app.on_event("startup")
 async def startup_event():
-    """應用程式啟動時初始化圖片生成器"""
-    global generator
-    generator = perchance.ImageGenerator()
+    """應用程式啟動時初始化生成器"""
+    global generator, text_generator, http_session, browser, key_task, transcode_pool
+    http_session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=30.0, ttl_dns_cache=300)
+    )
+    browser = perchance.BrowserManager()
+    generator = perchance.ImageGenerator(session=http_session, browser=browser)
+    text_generator = perchance.TextGenerator(
+        session=http_session,
+        browser=browser,
+        # 只限制串流開始後兩段內容的間隔，等待串流名額與取得金鑰不計入
+        timeouts=perchance.Timeouts(idle=TEXT_IDLE_TIMEOUT),
+    )
+    # spawn 不會複製事件迴圈的執行緒狀態，各平台行為一致
+    transcode_pool = ProcessPoolExecutor(
+        max_workers=TRANSCODE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    formats = await asyncio.to_thread(transcode.supported_formats)
+    print(f"🖼️ 支援的輸出格式: {', '.join(formats)}")
+    job_queue.start()
+
+    if KEY_WARMUP:
+        key_task = asyncio.create_task(keep_keys_fresh())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用程式關閉時完成剩餘工作，再釋放連線與瀏覽器"""
+    await job_queue.stop(DRAIN_TIMEOUT)
+    if key_task is not None:
+        key_task.cancel()
+        try:
+            await key_task
+        except asyncio.CancelledError:
+            pass
+    for gen in (generator, text_generator):
+        if gen is not None:
+            await gen.aclose()
+    if transcode_pool is not None:
+        await asyncio.to_thread(transcode_pool.shutdown)
+    if http_session is not None:
+        await http_session.close()
+    if browser is not None:
+        await browser.aclose()
 
 
 @app.get("/")
@@ -64,6 +390,189 @@ async def root():
     return {"message": "Perchance圖片生成API服務運行中"}
 
 
+class RequestCoalescer:
+    """合併相同的進行中請求，並統計合併命中率"""
+
+    def __init__(self):
+        self._flight = SingleFlight()
+        self.requests = 0
+        self.hits = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+    async def run(self, key, func, *args):
+        self.requests += 1
+        if self._flight.in_flight(key):
+            self.hits += 1
+        return await self._flight.do(key, func, *args)
+
+
+coalescer = RequestCoalescer()
+
+# 服務層的統計也一併輸出到 /metrics
+REGISTRY.counter(
+    "perchance_api_coalesce_requests_total", "可合併的固定種子圖片請求數"
+).set_function(lambda: coalescer.requests)
+REGISTRY.counter(
+    "perchance_api_coalesce_hits_total", "共用進行中生成結果的請求數"
+).set_function(lambda: coalescer.hits)
+REGISTRY.gauge(
+    "perchance_api_jobs_pending", "佇列中等待處理的工作數"
+).set_function(lambda: job_queue.pending)
+
+
+class VariantCache:
+    """依 image_id 快取轉檔後的圖片，超過容量時移除最久未使用的項目"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[bytes, int, int]] = OrderedDict()
+        # 同一個版本同時只轉檔一次
+        self._flight = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: tuple, func, *args) -> tuple[bytes, int, int]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return await self._flight.do(key, self._fill, key, func, *args)
+
+    async def _fill(self, key: tuple, func, *args) -> tuple[bytes, int, int]:
+        entry = await func(*args)
+        if len(entry[0]) <= self.max_bytes:
+            self._entries[key] = entry
+            self.size += len(entry[0])
+            while self.size > self.max_bytes:
+                _, (data, _, _) = self._entries.popitem(last=False)
+                self.size -= len(data)
+        return entry
+
+
+variants = VariantCache(VARIANT_CACHE_BYTES)
+
+REGISTRY.counter(
+    "perchance_api_variant_cache_hits_total", "由快取提供的轉檔圖片數"
+).set_function(lambda: variants.hits)
+REGISTRY.counter(
+    "perchance_api_variant_cache_misses_total", "需要轉檔的圖片數"
+).set_function(lambda: variants.misses)
+TRANSCODE_SECONDS = REGISTRY.histogram("perchance_api_transcode_seconds", "轉檔與縮圖耗時（秒）")
+
+
+def check_output_format(request: ImageRequest):
+    """在生成前確認要求的輸出格式可用"""
+    if request.format is not None and request.format not in transcode.supported_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支援的輸出格式: {request.format}，可用格式: {', '.join(transcode.supported_formats())}",
+        )
+
+
+def wants_transform(request: ImageRequest) -> bool:
+    return request.format is not None or request.max_dimension is not None
+
+
+async def run_transform(data: bytes, image_format: str, quality: int, max_dimension: Optional[int]):
+    """在行程池中轉檔，不阻塞事件迴圈"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            transcode_pool, transcode.transform, data, image_format, quality, max_dimension
+        )
+    finally:
+        TRANSCODE_SECONDS.observe(time.perf_counter() - started)
+
+
+async def render_image(
+    result: perchance.ImageResponse, request: Optional[ImageRequest] = None
+) -> tuple[bytes, str, int, int]:
+    """依請求的格式與尺寸產生圖片，回傳位元組、副檔名與寬高"""
+    data = (await result.download()).getvalue()
+    if request is None or not wants_transform(request):
+        return data, result.file_ext, result.width, result.height
+
+    # 只縮圖時沿用上游的格式
+    image_format = request.format or {"jpg": "jpeg"}.get(result.file_ext, result.file_ext)
+    if image_format not in transcode.supported_formats():
+        image_format = "jpeg"
+    quality = request.quality if image_format != "png" else None
+
+    encoded, width, height = await variants.get(
+        (result.image_id, image_format, quality, request.max_dimension),
+        run_transform, data, image_format, request.quality, request.max_dimension,
+    )
+    return encoded, image_format, width, height
+
+
+def request_key(request: ImageRequest) -> tuple:
+    """正規化後的請求參數，作為合併請求的依據"""
+    return (
+        request.prompt,
+        request.negative_prompt or "",
+        request.seed,
+        request.shape,
+        float(request.guidance_scale),
+    )
+
+
+async def create_image(request: ImageRequest) -> perchance.ImageResponse:
+    """生成圖片，只取得中繼資料，不下載"""
+    return await generator.image(
+        prompt=request.prompt,
+        negative_prompt=request.negative_prompt,
+        seed=request.seed,
+        shape=request.shape,
+        guidance_scale=request.guidance_scale
+    )
+
+
+async def generate_image(request: ImageRequest) -> perchance.ImageResponse:
+    """生成並下載圖片"""
+    result = await create_image(request)
+    await result.download()
+    return result
+
+
+async def run_image_request(request: ImageRequest) -> perchance.ImageResponse:
+    """生成並下載圖片，固定種子的相同請求會合併"""
+    if request.seed != -1:
+        # 固定種子的結果是確定的，相同的進行中請求共用同一次生成
+        return await coalescer.run(request_key(request), generate_image, request)
+    return await generate_image(request)
+
+
+async def build_response_data(
+    result: perchance.ImageResponse, request: Optional[ImageRequest] = None
+) -> ImageResponseData:
+    """將已下載的圖片依請求轉檔後轉換為Base64回應資料"""
+    image_data, file_ext, width, height = await render_image(result, request)
+
+    return ImageResponseData(
+        image_base64=base64.b64encode(image_data).decode('utf-8'),
+        image_type=file_ext,
+        image_id=result.image_id,
+        seed=result.seed,
+        prompt=result.prompt,
+        width=width,
+        height=height,
+        guidance_scale=result.guidance_scale,
+        negative_prompt=result.negative_prompt,
+        maybe_nsfw=result.maybe_nsfw
+    )
+
+
 @app.post("/api/txttoimage", response_model=ImageResponseData)
 async def text_to_image(request: ImageRequest):
     """
@@ -74,45 +583,84 @@ async def text_to_image(request: ImageRequest):
     try:
         if generator is None:
             raise HTTPException(status_code=500, detail="圖片生成器未初始化")
+        check_output_format(request)
         
         print(f"🎨 開始生成圖片: {request.prompt}")
         
-        # 使用ImageGenerator生成圖片
-        async with await generator.image(
-            prompt=request.prompt,
-            negative_prompt=request.negative_prompt,
-            seed=request.seed,
-            shape=request.shape,
-            guidance_scale=request.guidance_scale
-        ) as result:
+        result = await run_image_request(request)
+
+        print(f"✅ 圖片生成完成，ID: {result.image_id}")
+
+        response_data = await build_response_data(result, request)
+
+        print(f"📦 圖片已轉換為Base64，大小: {len(response_data.image_base64)} 字元")
+
+        return response_data
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_msg = str(e)
+        error_trace = traceback.format_exc()
+        print(f"❌ 圖片生成失敗: {error_msg}")
+        print(f"🔍 詳細錯誤信息:\n{error_trace}")
+        raise HTTPException(status_code=500, detail=f"圖片生成失敗: {error_msg}")
+
+
+def image_headers(
+    result: perchance.ImageResponse,
+    file_ext: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+) -> dict[str, str]:
+    """以回應標頭攜帶圖片的中繼資料，轉檔後的圖片傳入實際的格式與尺寸"""
+    return {
+        "X-Image-Id": result.image_id,
+        "X-Seed": str(result.seed),
+        "X-Width": str(width or result.width),
+        "X-Height": str(height or result.height),
+        "X-Guidance-Scale": str(result.guidance_scale),
+        "X-Maybe-Nsfw": "true" if result.maybe_nsfw else "false",
+        "Content-Disposition": f'inline; filename="{result.image_id}.{file_ext or result.file_ext}"',
+    }
+
+
+@app.post("/api/txttoimage/raw")
+async def text_to_image_raw(request: ImageRequest):
+    """
+    文字轉圖片API端點（二進位串流）
+
+    直接串流原始圖片位元組，不經過Base64編碼，圖片資訊放在回應標頭中；
+    要求轉檔或縮圖時，下載完成並轉檔後才一次回傳
+    """
+    try:
+        if generator is None:
+            raise HTTPException(status_code=500, detail="圖片生成器未初始化")
+        check_output_format(request)
+
+        print(f"🎨 開始生成圖片: {request.prompt}")
+
+        if wants_transform(request):
+            result = await run_image_request(request)
             print(f"✅ 圖片生成完成，ID: {result.image_id}")
-            
-            # 下載圖片資料
-            image_data = await result.download()
-            
-            # 轉換為Base64
-            image_data.seek(0)
-            image_bytes = image_data.read()
-            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-            
-            print(f"📦 圖片已轉換為Base64，大小: {len(image_base64)} 字元")
-            
-            # 組建回應資料
-            response_data = ImageResponseData(
-                image_base64=image_base64,
-                image_type=result.file_ext,
-                image_id=result.image_id,
-                seed=result.seed,
-                prompt=result.prompt,
-                width=result.width,
-                height=result.height,
-                guidance_scale=result.guidance_scale,
-                negative_prompt=result.negative_prompt,
-                maybe_nsfw=result.maybe_nsfw
+
+            data, file_ext, width, height = await render_image(result, request)
+            media_type = mimetypes.guess_type(f"image.{file_ext}")[0] or "application/octet-stream"
+            return Response(
+                content=data, media_type=media_type, headers=image_headers(result, file_ext, width, height)
             )
-            
-            return response_data
-            
+
+        if request.seed != -1:
+            # 相同的請求只合併生成，各自串流下載，不必等整張圖片下載完
+            result = await coalescer.run(("stream", *request_key(request)), create_image, request)
+        else:
+            result = await create_image(request)
+        print(f"✅ 圖片生成完成，ID: {result.image_id}")
+
+        # 先取得第一個區塊，讓下載失敗時仍能回傳錯誤狀態碼
+        chunks = result.iter_chunks()
+        first_chunk = await anext(chunks, b"")
     except HTTPException:
         raise
     except Exception as e:
@@ -123,15 +671,155 @@ async def text_to_image(request: ImageRequest):
         print(f"🔍 詳細錯誤信息:\n{error_trace}")
         raise HTTPException(status_code=500, detail=f"圖片生成失敗: {error_msg}")
 
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            if first_chunk:
+                yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    media_type = mimetypes.guess_type(f"image.{result.file_ext}")[0] or "application/octet-stream"
+
+    return StreamingResponse(body(), media_type=media_type, headers=image_headers(result))
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """組成一個SSE事件"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event is None:
+        return f"data: {payload}\n\n"
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/api/text")
+async def text(request: TextRequest):
+    """
+    文字生成API端點（SSE串流）
+
+    以Server-Sent Events逐段回傳生成的文字；客戶端斷線時會一併關閉上游串流
+    """
+    if text_generator is None:
+        raise HTTPException(status_code=500, detail="文字生成器未初始化")
+
+    print(f"📝 開始生成文字: {request.prompt}")
+
+    chunks = text_generator.text(request.prompt, start_with=request.start_with)
+
+    async def events() -> AsyncIterator[str]:
+        # 客戶端斷線時Starlette會取消此生成器，finally中關閉上游串流
+        try:
+            async for chunk in chunks:
+                yield sse_event({"text": chunk})
+
+            yield sse_event({}, event="done")
+        except perchance.TimeoutError as e:
+            print(f"❌ 文字串流逾時: {e.phase}")
+            yield sse_event({"detail": "文字串流逾時"}, event="error")
+        except Exception as e:
+            print(f"❌ 文字生成失敗: {e}")
+            yield sse_event({"detail": f"文字生成失敗: {e}"}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: ImageRequest):
+    """
+    建立非同步圖片生成工作
+
+    立即回傳工作ID，佇列已滿時回傳503與 Retry-After
+    """
+    if generator is None:
+        raise HTTPException(status_code=500, detail="圖片生成器未初始化")
+    check_output_format(request)
+
+    try:
+        job = job_queue.submit(request)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="工作佇列已滿，請稍後再試",
+            headers={"Retry-After": str(job_queue.retry_after())},
+        )
+
+    print(f"📥 工作已排入佇列: {job.id} ({request.prompt})")
+    return job.to_response()
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60, description="等待完成的最長秒數")):
+    """
+    查詢工作狀態
+
+    指定 wait 時會等待工作完成（長輪詢），最多等待指定秒數
+    """
+    response = await job_queue.get(job_id, wait)
+    if response is None:
+        raise HTTPException(status_code=404, detail="找不到工作")
+    return response
+
+
+@app.get("/api/stats")
+async def stats():
+    """服務統計資料"""
+    return {
+        "coalesce": {
+            "requests": coalescer.requests,
+            "hits": coalescer.hits,
+            "hit_rate": coalescer.hit_rate,
+        },
+        "jobs": {
+            "pending": job_queue.pending,
+            "capacity": job_queue.size,
+            "workers": job_queue.workers,
+        },
+        "variants": {
+            "hits": variants.hits,
+            "misses": variants.misses,
+            "entries": len(variants),
+            "bytes": variants.size,
+        },
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文字格式的監控指標"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 @app.get("/health")
 async def health_check():
-    """健康檢查端點"""
-    return {"status": "healthy", "generator_ready": generator is not None}
+    """
+    健康檢查端點
+
+    啟用金鑰預熱時，金鑰就緒前回傳503
+    """
+    ready = generator is not None and text_generator is not None and (keys_ready or not KEY_WARMUP)
+    content = {
+        "status": "healthy" if ready else "starting",
+        "generator_ready": generator is not None,
+        "text_generator_ready": text_generator is not None,
+        "keys_ready": keys_ready,
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
 
 
 def main():
     """啟動Web API服務"""
+    # 只有直接啟動時才需要 uvicorn，由 uvicorn 載入的 worker 不必重複匯入
+    import uvicorn
+
     uvicorn.run(
         "web_api:app",
         host="0.0.0.0",